@@ -0,0 +1,94 @@
+"""Benchmark of the set-based send and status result writes against the ORM loop.
+
+Compares, on sms.sms records that each have a tracker and a mailing trace:
+
+* the former code: one ``record.write`` per record to store its provider
+  message ID, then one ``write`` of ``last_status_check`` and one
+  ``_update_sms_state_and_trackers`` call per record for its status;
+* the current code: ``SmsSms._write_provider_message_ids``, then
+  ``SmsSms._apply_status_results`` with one call per target state.
+
+Everything runs in one transaction that is rolled back at the end, so it can
+run on any scratch database with the module installed::
+
+    odoo-bin shell -d bench --no-http < benchmarks/bench_bulk_writes.py
+
+BENCH_SIZES sets the record counts (default 10000,100000).
+"""
+import os
+import time
+
+from odoo import fields
+
+SIZES = [int(size) for size in os.environ.get('BENCH_SIZES', '10000,100000').split(',')]
+# One message in FAILED_EVERY is reported as failed by the status check
+FAILED_EVERY = 10
+
+
+def make_records(env, mailing, size):
+    Sms = env['sms.sms'].sudo()
+    records = Sms.create([
+        {'number': '+2376%08d' % i, 'body': 'Benchmark', 'state': 'process', 'mailing_id': mailing.id}
+        for i in range(size)
+    ])
+    traces = env['mailing.trace'].sudo().create([{
+        'trace_type': 'sms',
+        'mailing_id': mailing.id,
+        'model': 'res.partner',
+        'res_id': 0,
+        'sms_number': record.number,
+    } for record in records])
+    env['sms.tracker'].sudo().create([
+        {'sms_uuid': record.uuid, 'mailing_trace_id': trace.id} for record, trace in zip(records, traces)
+    ])
+    env.flush_all()
+    env.invalidate_all()
+    message_ids = ['msg-%d' % record_id for record_id in records.ids]
+    return Sms.browse(records.ids), message_ids
+
+
+def orm_loop(records, message_ids):
+    for record, message_id in zip(records, message_ids):
+        record.write({'state': 'pending', 'provider_message_id': message_id, 'failure_type': False})
+    for i, record in enumerate(records):
+        record.write({'last_status_check': fields.Datetime.now()})
+        if i % FAILED_EVERY:
+            record._update_sms_state_and_trackers('sent', failure_type=False)
+        else:
+            record._update_sms_state_and_trackers('error', failure_type='sms_server')
+
+
+def set_based(records, message_ids):
+    records._write_provider_message_ids(message_ids, fields.Datetime.now())
+    failed = records.browse(records.ids[::FAILED_EVERY])
+    records._apply_status_results(records - failed, failed)
+
+
+def run(env):
+    mailing = env['mailing.mailing'].create({
+        'subject': 'Bulk write benchmark',
+        'mailing_type': 'sms',
+        'body_plaintext': 'Benchmark',
+        'mailing_model_id': env['ir.model']._get_id('res.partner'),
+    })
+    try:
+        for size in SIZES:
+            for name, func in (('orm loop', orm_loop), ('set-based', set_based)):
+                records, message_ids = make_records(env, mailing, size)
+                sql_count = env.cr.sql_log_count
+                start = time.perf_counter()
+                func(records, message_ids)
+                env.flush_all()
+                elapsed = time.perf_counter() - start
+                env.cr.execute("SELECT count(*) FROM mailing_trace WHERE mailing_id = %s AND trace_status = 'sent'",
+                               [mailing.id])
+                print("%-9s %7d records   %8.2f s   %9.0f records/s   %7d queries   %7d traces sent" % (
+                    name, size, elapsed, size / elapsed, env.cr.sql_log_count - sql_count, env.cr.fetchone()[0]))
+                records.unlink()
+                env['mailing.trace'].sudo().search([('mailing_id', '=', mailing.id)]).unlink()
+    finally:
+        env.cr.rollback()
+
+
+if 'env' in globals():
+    run(env)  # noqa: F821
@@ -0,0 +1,57 @@
+"""Micro-benchmark of the response path extractor on 10k-recipient responses.
+
+Run from the module directory, no Odoo needed::
+
+    python benchmarks/bench_json_path.py
+"""
+import importlib.util
+import json
+import os
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECIPIENTS = 10000
+ROUNDS = 20
+
+
+def load_json_path():
+    path = os.path.join(HERE, os.pardir, 'tools', 'json_path.py')
+    spec = importlib.util.spec_from_file_location('json_path', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_responses():
+    messages = [
+        {'to': '2376%08d' % i, 'messageid': 'msg-%d' % i, 'status': 'queued'}
+        for i in range(RECIPIENTS)
+    ]
+    return {
+        'flat list': ({'success': True, 'messages': messages}, 'messages.messageid'),
+        'indexed': ({'data': {'batches': [{'messages': messages}]}}, 'data.batches[0].messages[*].messageid'),
+        'recursive': ({'success': True, 'data': {'result': messages}}, 'messageid'),
+        'descent': ({'data': {'result': messages}}, 'data..status'),
+    }
+
+
+def main():
+    json_path = load_json_path()
+    for name, (response, expression) in make_responses().items():
+        # Round-trip so the body is shaped exactly like a decoded HTTP response
+        response = json.loads(json.dumps(response))
+        start = time.perf_counter()
+        path = json_path.compile_path.__wrapped__(expression)
+        compile_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _i in range(ROUNDS):
+            values = path.find_strings(response)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        assert len(values) == RECIPIENTS, (name, len(values))
+        print("%-10s %-42s compile %7.1f us   find %7.2f ms   %9.0f values/s" % (
+            name, expression, compile_time * 1e6, elapsed * 1e3, RECIPIENTS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Micro-benchmark of the compiled request templates.
+
+Compares, on a 1000-recipient send request and a 1000-ID status request,
+the former ``json.dumps`` / ``str.replace`` / ``json.loads`` rendering
+followed by the request encoding with ``PayloadTemplate.render_bytes``.
+Also checks that a message with quotes and newlines gives valid JSON.
+
+Run from the module directory, no Odoo needed::
+
+    python benchmarks/bench_payload_template.py
+"""
+import importlib.util
+import json
+import os
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECIPIENTS = 1000
+ROUNDS = 2000
+
+SEND_TEMPLATE = {
+    'from': '{sender}',
+    'to': '{recipient}',
+    'body': '{message}',
+    'auth': {'user': '{username}', 'pass': '{password}'},
+}
+STATUS_TEMPLATE = {'messageids': '{messageids}', 'user': '{username}', 'pass': '{password}'}
+
+
+def load_payload_template():
+    path = os.path.join(HERE, os.pardir, 'tools', 'payload_template.py')
+    spec = importlib.util.spec_from_file_location('payload_template', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def replace_render(template, params):
+    """The former rendering, followed by the encoding done by requests."""
+    template_str = json.dumps(template)
+    replacements = {'"{messageids}"': json.dumps(params['messageids'])}
+    replacements.update(('{%s}' % name, value if isinstance(value, str) else ','.join(value))
+                        for name, value in params.items())
+    for placeholder, value in replacements.items():
+        template_str = template_str.replace(placeholder, str(value))
+    try:
+        payload = json.loads(template_str)
+    except json.JSONDecodeError:
+        payload = template
+    return json.dumps(payload).encode()
+
+
+def main():
+    payload_template = load_payload_template()
+    params = {
+        'recipient': ','.join('+2376%08d' % i for i in range(RECIPIENTS)),
+        'message': 'Hello, your code is 1234',
+        'messageid': '',
+        'messageids': ['msg-%d' % i for i in range(RECIPIENTS)],
+        'sender': 'KARBURA',
+        'username': 'user',
+        'password': 'secret',
+    }
+    for name, template in (('send', SEND_TEMPLATE), ('status', STATUS_TEMPLATE)):
+        compiled = payload_template.compile_template(template)
+        assert json.loads(compiled.render_bytes(params)) == json.loads(replace_render(template, params)), name
+        for label, render in (('replace', lambda: replace_render(template, params)),
+                              ('compiled', lambda: compiled.render_bytes(params))):
+            start = time.perf_counter()
+            for _i in range(ROUNDS):
+                render()
+            elapsed = (time.perf_counter() - start) / ROUNDS
+            print("%-7s %-9s %8.1f us/request" % (name, label, elapsed * 1e6))
+
+    quoted = dict(params, message='He said "hi"\nsee you')
+    body = payload_template.compile_template(SEND_TEMPLATE).render_bytes(quoted)
+    assert json.loads(body)['body'] == quoted['message']
+    assert json.loads(replace_render(SEND_TEMPLATE, quoted)) == SEND_TEMPLATE
+    print("Message with quotes and newlines: compiled body is valid, former rendering fell back to the raw template")
+
+
+if __name__ == '__main__':
+    main()
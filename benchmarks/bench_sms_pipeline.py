@@ -0,0 +1,136 @@
+"""End-to-end benchmark of the SMS pipeline against a local mock provider.
+
+Drives ``Mailing._send_sms`` and the outbox dispatch, ``SmsSms._send`` and
+``SmsSms._check_sms_status`` at several sizes and reports, for each phase,
+throughput, p50/p99 provider request latency, SQL query count and peak
+Python memory. Everything runs in one transaction that is rolled back at
+the end, so it can run on any scratch database with the module installed::
+
+    odoo-bin shell -d bench --no-http < benchmarks/bench_sms_pipeline.py
+
+The run is tuned with environment variables: BENCH_SIZES (default
+1000,10000,100000), BENCH_LATENCY_MS, BENCH_ERROR_RATE,
+BENCH_MAX_RECIPIENTS (default 500) and BENCH_SHAPE (flat or nested).
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from odoo.modules.module import get_module_path
+
+sys.path.insert(0, os.path.join(get_module_path('karbura_notification'), 'benchmarks'))
+import mock_provider  # noqa: E402
+
+SIZES = [int(size) for size in os.environ.get('BENCH_SIZES', '1000,10000,100000').split(',')]
+LATENCY = float(os.environ.get('BENCH_LATENCY_MS', '0')) / 1000
+ERROR_RATE = float(os.environ.get('BENCH_ERROR_RATE', '0'))
+MAX_RECIPIENTS = int(os.environ.get('BENCH_MAX_RECIPIENTS', '500'))
+SHAPE = os.environ.get('BENCH_SHAPE', 'flat')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def make_provider(env, url):
+    env['karbura.notification.provider'].search([]).write({'active': False})
+    return env['karbura.notification.provider'].create(dict(
+        mock_provider.SHAPES[SHAPE],
+        name='Benchmark mock provider',
+        base_url=url + '/send',
+        status_url=url + '/status',
+        auth_type='none',
+        payload_template='{"to": "{recipient}", "body": "{message}"}',
+        status_body_template='{"messageids": "{messageids}"}',
+        status_waited='["pending"]',
+        status_mode='batch',
+        status_batch_size=MAX_RECIPIENTS or 500,
+        max_recipients_per_request=MAX_RECIPIENTS,
+        # Both the mailing and the _send phases leave their messages pending
+        status_check_limit=2 * max(SIZES),
+        status_check_time_budget=3600,
+        # The circuit breaker and rate limits keep their state on committed rows
+        breaker_enabled=False,
+    ))
+
+
+def send_mailing(env, mailing, partners):
+    mailing._send_sms(partners, mailing.body_plaintext)
+    # A dispatch run stops at its time budget, a cron would run it again
+    while env['karbura.notification.outbox']._dispatch():
+        pass
+
+
+def measure(env, name, size, latencies, func):
+    """Run one phase and print its figures."""
+    del latencies[:]
+    sql_count = env.cr.sql_log_count
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func()
+    env.flush_all()
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    print("%-8s %7d msgs  %8.2f s  %9.0f msgs/s  p50 %7.1f ms  p99 %7.1f ms  %7d queries  peak %7.1f MiB" % (
+        name, size, elapsed, size / elapsed, percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3,
+        env.cr.sql_log_count - sql_count, peak / 2 ** 20))
+
+
+def run(env):
+    server, mock = mock_provider.start_server(latency=LATENCY, error_rate=ERROR_RATE,
+                                              max_recipients=MAX_RECIPIENTS, shape=SHAPE)
+    thread = threading.current_thread()
+    testing = getattr(thread, 'testing', False)
+    # The module does not commit in testing threads, so the whole run can be rolled back
+    thread.testing = True
+    tracemalloc.start()
+    try:
+        provider = make_provider(env, 'http://127.0.0.1:%s' % server.server_port)
+        latencies = []
+        session = env['karbura.notification.sms.api']._get_session(provider._get_config())
+        session.hooks['response'].append(lambda response, *args, **kwargs: latencies.append(
+            response.elapsed.total_seconds()))
+        Sms = env['sms.sms'].sudo()
+        print("Mock provider: shape %s, latency %.0f ms, error rate %.3f, max %s recipients per request" % (
+            SHAPE, LATENCY * 1e3, ERROR_RATE, MAX_RECIPIENTS or 'unlimited'))
+
+        for size in SIZES:
+            partners = env['res.partner'].create([
+                {'name': 'Benchmark %d' % i, 'mobile': '+2376%08d' % i} for i in range(size)
+            ])
+            mailing = env['mailing.mailing'].create({
+                'subject': 'Benchmark %d' % size,
+                'mailing_type': 'sms',
+                'body_plaintext': 'Hello {{ object.name }}',
+                'mailing_model_id': env['ir.model']._get_id('res.partner'),
+                'sms_provider_id': provider.id,
+            })
+            measure(env, 'mailing', size, latencies, lambda: send_mailing(env, mailing, partners))
+
+            sms = Sms.create([{'number': '+2377%08d' % i, 'body': 'Benchmark'} for i in range(size)])
+            measure(env, '_send', size, latencies, lambda: sms._send(unlink_sent=False))
+
+            env.cr.execute("""
+                UPDATE sms_sms SET next_status_check = (now() AT TIME ZONE 'UTC') - interval '1 second'
+                 WHERE state = 'pending'
+            """)
+            pending = env.cr.rowcount
+            env.invalidate_all()
+            measure(env, 'status', pending, latencies, lambda: Sms._check_sms_status())
+
+        print("Mock provider served %s requests (%s errors) for %s messages" % (
+            mock.requests, mock.errors, mock.messages))
+    finally:
+        tracemalloc.stop()
+        thread.testing = testing
+        env.cr.rollback()
+        server.shutdown()
+
+
+if 'env' in globals():
+    run(env)  # noqa: F821
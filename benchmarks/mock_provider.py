@@ -0,0 +1,151 @@
+"""Local mock SMS provider for the benchmarks.
+
+Serves a send endpoint and a batch status endpoint with configurable
+latency, error rate, recipient limit and response shape. It can run on its
+own, to point a provider of a development database at it::
+
+    python benchmarks/mock_provider.py --port 8099 --latency 50 --error-rate 0.01
+
+or be started in-process with :func:`start_server`. Requests follow the
+default templates of the module: the send body holds the comma-separated
+recipients in ``to``, the status body holds the message IDs in
+``messageids``. Every message is reported as delivered.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Response shapes, with the provider paths that read them
+SHAPES = {
+    'flat': {
+        'message_id_field': 'messages.messageid',
+        'status_field': 'statuses.status',
+        'status_message_id_field': 'statuses.messageid',
+    },
+    'nested': {
+        'message_id_field': 'data.results[*].id',
+        'status_field': 'data.reports[*].state.code',
+        'status_message_id_field': 'data.reports[*].id',
+    },
+}
+
+
+class MockProvider:
+    """Behaviour and counters of a mock provider server."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, max_recipients=0, shape='flat'):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_recipients = max_recipients
+        self.shape = shape
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.messages = 0
+
+    def send(self, payload):
+        recipients = [number for number in str(payload.get('to') or '').split(',') if number]
+        if self.max_recipients and len(recipients) > self.max_recipients:
+            return 413, {'success': False, 'error': 'too many recipients'}
+        with self.lock:
+            message_ids = ['mock-%d' % next(self.ids) for _number in recipients]
+            self.messages += len(recipients)
+        if self.shape == 'nested':
+            return 200, {'success': True, 'data': {'results': [
+                {'to': number, 'id': message_id} for number, message_id in zip(recipients, message_ids)
+            ]}}
+        return 200, {'success': True, 'messages': [
+            {'to': number, 'messageid': message_id} for number, message_id in zip(recipients, message_ids)
+        ]}
+
+    def status(self, payload):
+        message_ids = payload.get('messageids') or [payload.get('messageid')]
+        if isinstance(message_ids, str):
+            message_ids = message_ids.split(',')
+        if self.shape == 'nested':
+            return 200, {'data': {'reports': [
+                {'id': message_id, 'state': {'code': 'delivered'}} for message_id in message_ids
+            ]}}
+        return 200, {'statuses': [
+            {'messageid': message_id, 'status': 'delivered'} for message_id in message_ids
+        ]}
+
+    def handle(self, path, payload):
+        with self.lock:
+            self.requests += 1
+            failed = random.random() < self.error_rate
+            self.errors += failed
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return 500, {'success': False, 'error': 'mock failure'}
+        if path == '/send':
+            return self.send(payload)
+        if path == '/status':
+            return self.status(payload)
+        return 404, {'success': False, 'error': 'unknown endpoint'}
+
+
+def _make_handler(provider):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                payload = {}
+            status, body = provider.handle(self.path, payload)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(port=0, **options):
+    """Start a mock provider in a background thread.
+
+    Returns:
+        tuple: (server, MockProvider); the server URL is
+        ``http://127.0.0.1:<server.server_port>``
+    """
+    provider = MockProvider(**options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), _make_handler(provider))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='mock-sms-provider').start()
+    return server, provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='milliseconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-recipients', type=int, default=0)
+    parser.add_argument('--shape', choices=sorted(SHAPES), default='flat')
+    args = parser.parse_args()
+    server, _provider = start_server(args.port, latency=args.latency / 1000, error_rate=args.error_rate,
+                                     max_recipients=args.max_recipients, shape=args.shape)
+    print("Mock SMS provider on http://127.0.0.1:%s (send: /send, status: /status), paths: %s" % (
+        server.server_port, SHAPES[args.shape]))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import hmac
+import logging
+
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+
+class SmsDeliveryReceiptController(http.Controller):
+
+    @http.route('/karbura_notification/dlr/<int:provider_id>/<string:token>', type='http', auth='public',
+                methods=['GET', 'POST'], csrf=False, save_session=False)
+    def sms_delivery_receipt(self, provider_id, token, **params):
+        """Receive the delivery receipts pushed by a provider.
+
+        The payload is either a JSON body, holding one or many receipts, or
+        the query/form parameters of a single receipt.
+        """
+        provider = request.env['karbura.notification.provider'].sudo().browse(provider_id).exists()
+        if not provider or not provider.dlr_enabled or not provider.dlr_token \
+                or not hmac.compare_digest(provider.dlr_token.encode(), token.encode()):
+            raise NotFound()
+
+        if request.httprequest.mimetype == 'application/json':
+            try:
+                data = request.get_json_data()
+            except ValueError as e:
+                _logger.warning("Invalid delivery receipt payload from %s: %s", provider.name, str(e))
+                return request.make_json_response({'success': False, 'error': 'invalid JSON'}, status=400)
+        else:
+            data = params
+
+        result = request.env['sms.sms'].sudo()._apply_delivery_receipts(provider, data)
+        return request.make_json_response(dict(result, success=True))
+
+
+class SmsMetricsController(http.Controller):
+
+    @http.route('/karbura_notification/metrics', type='http', auth='public', methods=['GET'],
+                csrf=False, save_session=False)
+    def sms_metrics(self, token=None, **params):
+        """Export the SMS metrics of every worker in Prometheus text format.
+
+        The scraper authenticates with the ``karbura_notification.metrics_token``
+        system parameter, given as a bearer token or as the ``token``
+        parameter. The endpoint does not exist while no token is set.
+        """
+        expected = request.env['ir.config_parameter'].sudo().get_param('karbura_notification.metrics_token')
+        authorization = request.httprequest.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+        if not expected or not token or not hmac.compare_digest(expected.encode(), token.encode()):
+            raise NotFound()
+
+        body = request.env['karbura.notification.metric'].sudo()._render_prometheus()
+        return request.make_response(body, headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')])
@@ -5,3 +5,8 @@ from . import sms_sms
 from . import extra_field
 from . import extra_params_status
 from . import extra_header
+from . import rate_bucket
+from . import metric
+from . import outbox
+from . import circuit_breaker
+from . import delivery_receipt
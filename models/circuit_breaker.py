@@ -0,0 +1,132 @@
+import logging
+import math
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker(models.Model):
+    _name = 'karbura.notification.circuit.breaker'
+    _description = 'SMS Provider Circuit Breaker'
+    _log_access = False
+
+    provider_id = fields.Many2one('karbura.notification.provider', string='Provider', required=True, ondelete='cascade')
+    state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half-Open'),
+    ], string='State', required=True, default='closed')
+    requests = fields.Float(string='Recent Requests', digits=(16, 4))
+    failures = fields.Float(string='Recent Failures', digits=(16, 4))
+    updated_at = fields.Float(string='Updated At (epoch)', digits=(16, 6))
+    opened_at = fields.Float(string='Opened At (epoch)', digits=(16, 6))
+
+    _sql_constraints = [
+        ('provider_uniq', 'unique(provider_id)', 'A provider can only have one circuit breaker.'),
+    ]
+
+    @api.model
+    def _admit(self, configs, probe=True):
+        """Tell which providers may be sent to right now.
+
+        An open circuit whose open time is over lets a single probe through:
+        the first worker to see it moves it to half-open and gets the probe,
+        the others keep treating it as open. A half-open circuit whose probe
+        never reported back is probed again after the same time. Callers
+        that would not send the probe, e.g. looking for a provider to fail
+        over to, pass ``probe=False`` so as not to take it.
+
+        Args:
+            configs: Configuration snapshots of the providers
+            probe: Whether the caller takes and sends the probes
+
+        Returns:
+            dict: provider ID to 'closed', 'probe' or 'open'
+        """
+        admission = {config.id: 'closed' for config in configs}
+        configs = {config.id: config for config in configs if config.breaker_enabled}
+        if not configs:
+            return admission
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                SELECT provider_id, state, opened_at, extract(epoch FROM clock_timestamp())
+                  FROM karbura_notification_circuit_breaker
+                 WHERE provider_id IN %s AND state != 'closed'
+            """, [tuple(configs)])
+            for provider_id, state, opened_at, now in cr.fetchall():
+                config = configs[provider_id]
+                admission[provider_id] = 'open'
+                if not probe or now - (opened_at or 0) < config.breaker_open_seconds:
+                    continue
+                # Compare and set, so that a single worker wins the probe
+                cr.execute("""
+                    UPDATE karbura_notification_circuit_breaker
+                       SET state = 'half_open', opened_at = %s
+                     WHERE provider_id = %s AND state = %s AND opened_at IS NOT DISTINCT FROM %s
+                """, [now, provider_id, state, opened_at])
+                if cr.rowcount:
+                    _logger.info("Circuit of SMS provider %s is half-open, probing it", config.name)
+                    admission[provider_id] = 'probe'
+        return admission
+
+    @api.model
+    def _record(self, config, requests, failures):
+        """Add the outcome of send requests to the rolling error rate of a provider.
+
+        Counters decay exponentially over ``breaker_window`` seconds. The
+        row is locked and updated on a dedicated cursor that is committed
+        right away, so every worker sees the same circuit.
+
+        Returns:
+            str: the state of the circuit after the update
+        """
+        if not config.breaker_enabled or not requests:
+            return 'closed'
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO karbura_notification_circuit_breaker (provider_id, state, requests, failures, updated_at)
+                VALUES (%s, 'closed', 0, 0, extract(epoch FROM clock_timestamp()))
+                ON CONFLICT (provider_id) DO NOTHING
+            """, [config.id])
+            cr.execute("""
+                SELECT state, requests, failures, updated_at, extract(epoch FROM clock_timestamp())
+                  FROM karbura_notification_circuit_breaker
+                 WHERE provider_id = %s
+                   FOR UPDATE
+            """, [config.id])
+            state, total, failed, updated_at, now = cr.fetchone()
+            decay = math.exp(-max(now - (updated_at or now), 0) / max(config.breaker_window, 1))
+            total = total * decay + requests
+            failed = failed * decay + failures
+            opened_at = None
+            if state == 'half_open':
+                # The probe decides alone
+                if failures:
+                    state, opened_at = 'open', now
+                else:
+                    state, total, failed = 'closed', requests, 0.0
+                    _logger.info("Circuit of SMS provider %s closed after a successful probe", config.name)
+            elif state == 'closed' and total >= config.breaker_min_requests \
+                    and failed / total >= config.breaker_error_rate:
+                state, opened_at = 'open', now
+            if opened_at:
+                _logger.warning("Circuit of SMS provider %s opened: %.0f%% of recent requests failed",
+                                config.name, 100 * failed / total)
+            cr.execute("""
+                UPDATE karbura_notification_circuit_breaker
+                   SET state = %s, requests = %s, failures = %s, updated_at = %s,
+                       opened_at = COALESCE(%s, opened_at)
+                 WHERE provider_id = %s
+            """, [state, total, failed, now, opened_at, config.id])
+        return state
+
+    @api.model
+    def _reset(self, provider_ids):
+        """Close the circuits of the given providers and forget their history."""
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                UPDATE karbura_notification_circuit_breaker
+                   SET state = 'closed', requests = 0, failures = 0, opened_at = NULL
+                 WHERE provider_id IN %s
+            """, [tuple(provider_ids)])
@@ -0,0 +1,64 @@
+from odoo import api, fields, models
+
+# Receipts whose message was not found are kept this many hours
+RETENTION_HOURS = 24
+
+
+class DeliveryReceipt(models.Model):
+    _name = 'karbura.notification.delivery.receipt'
+    _description = 'Unmatched SMS Delivery Receipt'
+    _log_access = False
+
+    provider_id = fields.Many2one('karbura.notification.provider', string='Provider', required=True,
+                                  ondelete='cascade')
+    message_id = fields.Char(string='Provider Message ID', required=True, index=True)
+    state = fields.Selection([
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ], string='State', required=True)
+    received_at = fields.Datetime(string='Received At', required=True)
+
+    @api.model
+    def _store(self, provider, receipts):
+        """Keep receipts that came before their message was recorded as sent.
+
+        A provider may push a receipt while the transaction that sends the
+        message is still open, so its message ID is not visible yet. The
+        receipt is stored and applied once the message is pending.
+
+        Args:
+            provider: SMS provider configuration
+            receipts: Final state by provider message ID
+        """
+        if not receipts:
+            return
+        self.env.cr.execute("""
+            INSERT INTO karbura_notification_delivery_receipt (provider_id, message_id, state, received_at)
+            SELECT %s, unnest(%s::varchar[]), unnest(%s::varchar[]), now() AT TIME ZONE 'UTC'
+        """, [provider.id, list(receipts), list(receipts.values())])
+
+    @api.model
+    def _take_matching(self, provider):
+        """Remove and return the stored receipts of a provider whose message is now pending.
+
+        Returns:
+            dict: Final state by provider message ID
+        """
+        self.env['sms.sms'].flush_model(['state', 'provider_id', 'provider_message_id'])
+        self.env.cr.execute("""
+            DELETE FROM karbura_notification_delivery_receipt AS r
+             WHERE r.provider_id = %s
+               AND EXISTS (SELECT 1 FROM sms_sms AS s
+                            WHERE s.provider_message_id = r.message_id AND s.state = 'pending'
+                              AND (s.provider_id = r.provider_id OR s.provider_id IS NULL))
+         RETURNING r.message_id, r.state
+        """, [provider.id])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _purge(self):
+        """Forget the receipts that never matched a message."""
+        self.env.cr.execute("""
+            DELETE FROM karbura_notification_delivery_receipt
+             WHERE received_at < (now() AT TIME ZONE 'UTC') - make_interval(hours => %s)
+        """, [RETENTION_HOURS])
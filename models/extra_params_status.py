@@ -1,4 +1,4 @@
-from odoo import fields, models
+from odoo import api, fields, models
 
 
 class ExtraParamsStatus(models.Model):
@@ -8,3 +8,21 @@ class ExtraParamsStatus(models.Model):
     provider_id = fields.Many2one('karbura.notification.provider', string='Provider', required=True, ondelete='cascade')
     name = fields.Char(string='Field Name', required=True)
     value = fields.Char(string='Field Value', required=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records.provider_id._touch_config()
+        return records
+
+    def write(self, vals):
+        providers = self.provider_id
+        res = super().write(vals)
+        (providers | self.provider_id)._touch_config()
+        return res
+
+    def unlink(self):
+        providers = self.provider_id
+        res = super().unlink()
+        providers._touch_config()
+        return res
@@ -1,15 +1,40 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import split_every
+from odoo.tools.rendering_tools import parse_inline_template
+from ..tools.phone_numbers import normalize_numbers
+from ..tools.sms_logging import lazy_text, log_sampled
+from ..tools.sms_segments import analyze_bodies
 import logging
+import random
+import threading
 
 _logger = logging.getLogger(__name__)
 
+# Number of recipients whose SMS body is rendered by one _render_field call
+RENDER_BATCH_SIZE = 1000
+# Number of recipients whose SMS body is rendered for a segment estimate
+ESTIMATE_SAMPLE_SIZE = 1000
+
 class Mailing(models.Model):
     _inherit = 'mailing.mailing'
 
     sms_provider_id = fields.Many2one('karbura.notification.provider', string='SMS Provider',
         domain=[('active', '=', True)],
         help='Provider to use for sending SMS messages')
+    sms_streaming = fields.Boolean(string='Send by Pages',
+        help='Create, queue and commit the SMS of the campaign page by page. An interrupted '
+             'send resumes after the last page committed, without creating duplicates.')
+    sms_page_size = fields.Integer(string='SMS Page Size', default=1000,
+        help='Number of recipients processed by each page of a paged send')
+    sms_stream_checkpoint = fields.Integer(string='Last Recipient Sent', readonly=True, copy=False,
+        help='ID of the last recipient record of the last page committed by an unfinished paged send')
+    sms_segment_estimate = fields.Integer(string='Estimated Segments', readonly=True, copy=False,
+        help='SMS segments the remaining recipients will be sent, as of the last estimate')
+    sms_unicode_estimate = fields.Integer(string='Unicode Messages', readonly=True, copy=False,
+        help='Messages of the last estimate that need UCS-2, which fits fewer characters per segment')
+    sms_cost_estimate = fields.Float(string='Estimated Cost', readonly=True, copy=False,
+        help='Estimated segments multiplied by the cost per SMS of the provider')
 
     state = fields.Selection([
         ('draft', 'Draft'),
@@ -55,58 +80,193 @@ class Mailing(models.Model):
                 # Check for SMS provider
                 if not mailing.sms_provider_id:
                     raise UserError(_('Please select an SMS provider before sending the campaign.'))
+
+                mailing._estimate_sms_segments(recipients)
                 
         return super().action_put_in_queue()
 
+    def action_estimate_sms_segments(self):
+        for mailing in self.filtered(lambda m: m.mailing_type == 'sms'):
+            mailing._estimate_sms_segments()
+
+    def _estimate_sms_segments(self, res_ids=None):
+        """Estimate the SMS segments of the remaining recipients and store the cost estimate.
+
+        Only a random sample of ``ESTIMATE_SAMPLE_SIZE`` recipients is
+        rendered, as on send, and its counts are scaled to all recipients, so
+        the estimate takes the same time on any list size. Duplicate and
+        invalid numbers are only dropped on send, so the estimate is an upper
+        bound.
+        """
+        self.ensure_one()
+        if res_ids is None:
+            res_ids = self._get_remaining_recipients()
+        res_ids = list(res_ids)
+        sample_ids = random.sample(res_ids, ESTIMATE_SAMPLE_SIZE) if len(res_ids) > ESTIMATE_SAMPLE_SIZE else res_ids
+        records = self.env[self.mailing_model_real].browse(sample_ids)
+        bodies = self._render_sms_bodies([record.id for record in records if self._get_recipient_phone(record)])
+        analysis = analyze_bodies(list(bodies.values()))
+        scale = len(res_ids) / len(sample_ids) if sample_ids else 0
+        provider = self.sms_provider_id or self._get_default_sms_provider()
+        segments = round(sum(count for _encoding, count in analysis) * scale)
+        self.write({
+            'sms_segment_estimate': segments,
+            'sms_unicode_estimate': round(sum(1 for encoding, _count in analysis if encoding == 'ucs2') * scale),
+            'sms_cost_estimate': segments * provider.cost_per_sms,
+        })
+        _logger.info("Mailing %s: about %s SMS in %s segments, from %s recipients rendered",
+                     self.id, round(len(analysis) * scale), segments, len(sample_ids))
+
     def _send_sms(self, records, body):
         """Override to use custom SMS provider."""
         if not records:
             raise UserError(_('No valid recipients found for this SMS campaign.'))
             
-        _logger.info("=== Starting _send_sms in mailing.mailing ===")
-        _logger.info("Records count: %s, Body preview: %s", len(records), body[:100] if body else None)
+        _logger.debug("Records count: %s, Body preview: %s", len(records), lazy_text(body, 100))
         
         if self.mailing_type != 'sms':
-            _logger.info("Not an SMS mailing, using standard method")
+            _logger.debug("Not an SMS mailing, using standard method")
             return super()._send_sms(records, body)
 
-        _logger.info("Starting SMS mailing to %s recipients", len(records))
+        _logger.info("Starting SMS mailing %s to %s recipients", self.id, len(records))
+        self.env['karbura.notification.sms.api']._refresh_log_settings()
         provider = self.sms_provider_id or self._get_default_sms_provider()
         if not provider:
             _logger.error("No SMS provider configured")
             raise UserError(_('No SMS provider configured'))
         
-        _logger.info("Using provider: %s", provider.name)
+        _logger.debug("Using provider: %s", provider.name)
         
+        if self.sms_streaming:
+            self._send_sms_by_pages(records)
+            _logger.info("Finished SMS mailing %s", self.id)
+            return True
+
         # Create SMS records first
-        sms_values = []
-        for record in records:
-            phone = self._get_recipient_phone(record)
-            if phone:
-                rendered_body = self._render_field('body_plaintext', [record.id])[record.id]
-                sms_values.append({
-                    'number': phone,
-                    'body': rendered_body,
-                    'mailing_id': self.id,
-                })
-                _logger.debug("Prepared SMS for %s: %s", phone, rendered_body[:50])
-            else:
-                _logger.warning("No phone number found for record %s", record)
+        sms_values = self._prepare_sms_values(records)
 
         _logger.info("Creating %s SMS records", len(sms_values))
         sms_records = self.env['sms.sms'].sudo().create(sms_values)
-        _logger.info("Created SMS records: %s", sms_records.ids)
         
-        # Let the SMS model handle the sending
+        # Queue them in the outbox, the dispatch workers send them
+        sms_records = sms_records.filtered(lambda r: r.state == 'outgoing')
         if sms_records:
-            _logger.info("Calling _send on SMS records")
-            sms_records._send(raise_exception=False)
+            self.env['karbura.notification.outbox'].sudo()._enqueue(sms_records.ids)
         else:
             _logger.warning("No SMS records created")
         
-        _logger.info("=== Finished _send_sms in mailing.mailing ===")
+        _logger.info("Finished SMS mailing %s", self.id)
         return True
 
+    def _send_sms_by_pages(self, records):
+        """Create, queue and commit the SMS of the recipients page by page.
+
+        Recipients are taken in ID order, skipping those up to the checkpoint
+        of an interrupted run. The SMS of a page are queued in the outbox and
+        committed together with the new checkpoint, so a page is either
+        entirely queued or not at all, and the dispatch workers start sending
+        it while the next page is rendered. The checkpoint is cleared once
+        every page is queued.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        page_size = max(self.sms_page_size, 1)
+        res_ids = sorted(res_id for res_id in records.ids if res_id > self.sms_stream_checkpoint)
+        if len(res_ids) < len(records):
+            _logger.info("Resuming SMS mailing %s after recipient %s, %s recipients left",
+                         self.id, self.sms_stream_checkpoint, len(res_ids))
+
+        for page_ids in split_every(page_size, res_ids, list):
+            sms_records = self.env['sms.sms'].sudo().create(self._prepare_sms_values(records.browse(page_ids)))
+            self.env['karbura.notification.outbox'].sudo()._enqueue(
+                sms_records.filtered(lambda r: r.state == 'outgoing').ids)
+            self.sms_stream_checkpoint = page_ids[-1]
+            if auto_commit:
+                self.env.cr.commit()
+            # Only keep the current page in memory
+            self.env.invalidate_all()
+            _logger.info("Queued SMS page up to recipient %s of mailing %s", page_ids[-1], self.id)
+
+        self.sms_stream_checkpoint = 0
+
+    def _prepare_sms_values(self, records):
+        """Return the sms.sms values of the recipients that have a phone number.
+
+        Numbers are normalised to E.164, national numbers being read as
+        numbers of the company country, or kept as they are when the company
+        has no country. An invalid or ambiguous number gets an SMS in
+        error that is never sent, and a number already used by the mailing,
+        in this batch or by an SMS created before, is only sent once.
+        """
+        raw_phones = {}
+        for record in records:
+            phone = self._get_recipient_phone(record)
+            if phone:
+                raw_phones[record.id] = phone
+            else:
+                log_sampled(_logger, logging.WARNING, "No phone number found for record %s", record)
+
+        numbers = normalize_numbers(list(raw_phones.values()), self.env.company.country_id.phone_code)
+        seen = set(self.env['sms.sms'].sudo().search([
+            ('mailing_id', '=', self.id),
+            ('number', 'in', list(set(filter(None, numbers)))),
+        ]).mapped('number'))
+        phones = {}
+        invalid_phones = []
+        for (res_id, raw_phone), number in zip(raw_phones.items(), numbers):
+            if not number:
+                invalid_phones.append(raw_phone)
+            elif number not in seen:
+                seen.add(number)
+                phones[res_id] = number
+        if invalid_phones or len(phones) + len(invalid_phones) < len(raw_phones):
+            _logger.info("Mailing %s: %s invalid and %s duplicate phone numbers out of %s", self.id,
+                         len(invalid_phones), len(raw_phones) - len(phones) - len(invalid_phones),
+                         len(raw_phones))
+
+        bodies = self._render_sms_bodies(list(phones))
+        return [{
+            'number': phone,
+            'body': bodies[res_id],
+            'mailing_id': self.id,
+        } for res_id, phone in phones.items()] + [{
+            'number': raw_phone,
+            'mailing_id': self.id,
+            'state': 'error',
+            'failure_type': 'sms_number_format',
+        } for raw_phone in invalid_phones]
+
+    def _render_sms_bodies(self, res_ids):
+        """Render the SMS body of every recipient with few bulk renderings.
+
+        Recipients are rendered by batches of ``RENDER_BATCH_SIZE``, so the
+        records used by the template are prefetched for a whole batch. A
+        body without placeholders is rendered once and shared by everyone.
+
+        Returns:
+            dict: Rendered body by recipient record ID
+        """
+        if not res_ids:
+            return {}
+        if not self._is_sms_body_dynamic():
+            body = self._render_field('body_plaintext', res_ids[:1])[res_ids[0]]
+            _logger.info("SMS body has no placeholders, rendered once for %s recipients", len(res_ids))
+            return dict.fromkeys(res_ids, body)
+
+        bodies = {}
+        for batch_ids in split_every(RENDER_BATCH_SIZE, res_ids, list):
+            bodies.update(self._render_field('body_plaintext', batch_ids))
+        _logger.info("Rendered %s SMS bodies", len(bodies))
+        return bodies
+
+    def _is_sms_body_dynamic(self):
+        """Tell whether the SMS body may differ from one recipient to another."""
+        engine = getattr(self._fields['body_plaintext'], 'render_engine', None) or 'inline_template'
+        if engine != 'inline_template':
+            return True
+        # (literal, expression, default) triples, the default coming from the ||| syntax
+        instructions = parse_inline_template(str(self.body_plaintext or ''))
+        return any(instruction[1] for instruction in instructions)
+
     def _get_recipient_phone(self, record):
         """Get recipient's phone number from record."""
         if hasattr(record, 'mobile'):
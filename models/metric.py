@@ -0,0 +1,79 @@
+import logging
+
+from odoo import api, fields, models
+
+from ..tools import metrics
+
+_logger = logging.getLogger(__name__)
+
+# Number of samples written by one statement of a flush
+FLUSH_PAGE_SIZE = 500
+
+
+class Metric(models.Model):
+    _name = 'karbura.notification.metric'
+    _description = 'SMS Metric Sample'
+    _log_access = False
+
+    name = fields.Char(string='Sample', required=True)
+    labels = fields.Char(string='Labels', required=True, default='')
+    value = fields.Float(string='Value', digits=(16, 6))
+
+    _sql_constraints = [
+        ('name_labels_uniq', 'unique(name, labels)', 'A sample can only be stored once.'),
+    ]
+
+    @api.model
+    def _flush(self):
+        """Add the metrics recorded by this worker to the shared samples.
+
+        Like the rate buckets, the samples are updated by upserts on a
+        dedicated cursor that is committed right away, so every worker adds
+        its own increments without holding a lock.
+        """
+        rows = [(name, labels, value) for (name, labels), value in metrics.drain().items()]
+        if not rows:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                for start in range(0, len(rows), FLUSH_PAGE_SIZE):
+                    page = rows[start:start + FLUSH_PAGE_SIZE]
+                    cr.execute("""
+                        INSERT INTO karbura_notification_metric AS m (name, labels, value)
+                        VALUES %s
+                        ON CONFLICT (name, labels) DO UPDATE
+                           SET value = m.value + EXCLUDED.value
+                    """ % ', '.join(['(%s, %s, %s)'] * len(page)),
+                        [value for row in page for value in row])
+        except Exception as e:
+            _logger.warning("Could not store %s SMS metric samples: %s", len(rows), str(e))
+
+    @api.model
+    def _render_prometheus(self):
+        """Return the metrics of every worker in Prometheus text format."""
+        self._flush()
+        self.env.cr.execute("SELECT name, labels, value FROM karbura_notification_metric")
+        samples = self.env.cr.fetchall()
+
+        self.env.cr.execute("""
+            SELECT state, count(*) FROM sms_sms
+             WHERE state IN ('outgoing', 'process', 'pending')
+             GROUP BY state
+        """)
+        depths = dict(self.env.cr.fetchall())
+        for state in ('outgoing', 'process', 'pending'):
+            samples.append(('karbura_sms_queue_depth', metrics.format_labels({'state': state}),
+                            depths.get(state, 0)))
+
+        # Served by the partial index of the pending messages
+        self.env.cr.execute("""
+            SELECT extract(epoch FROM (now() AT TIME ZONE 'UTC') - next_status_check)
+              FROM sms_sms
+             WHERE state = 'pending' AND provider_message_id IS NOT NULL
+               AND next_status_check IS NOT NULL
+             ORDER BY next_status_check NULLS FIRST, id
+             LIMIT 1
+        """)
+        row = self.env.cr.fetchone()
+        samples.append(('karbura_sms_status_poll_lag_seconds', '', max(row[0], 0) if row else 0))
+        return metrics.render(samples)
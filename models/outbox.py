@@ -0,0 +1,155 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# A claimed row is left alone by the other workers until its lease expires
+LEASE_SECONDS = 300
+# Number of SMS claimed and sent together by a worker
+CLAIM_BATCH_SIZE = 1000
+# Wall-clock time after which a dispatcher stops claiming new batches
+DISPATCH_TIME_BUDGET = 50
+# SMS whose lease expired this many times are given up
+MAX_ATTEMPTS = 3
+
+
+class Outbox(models.Model):
+    _name = 'karbura.notification.outbox'
+    _description = 'SMS Outbox'
+    _log_access = False
+    _order = 'id'
+
+    sms_id = fields.Many2one('sms.sms', string='SMS', required=True, ondelete='cascade')
+    lease_until = fields.Datetime(string='Leased Until')
+    lease_owner = fields.Char(string='Leased By')
+    attempts = fields.Integer(string='Attempts')
+
+    _sql_constraints = [
+        ('sms_uniq', 'unique(sms_id)', 'An SMS can only be queued once.'),
+    ]
+
+    @api.model
+    def _enqueue(self, sms_ids, at=None):
+        """Queue SMS for sending and wake a dispatcher up.
+
+        SMS already in the outbox are left as they are, and no dispatcher is
+        woken up when all of them were. With ``at``, the rows are created
+        with a lease ending then, so no worker claims them sooner.
+
+        Returns:
+            int: number of SMS queued
+        """
+        if not sms_ids:
+            return 0
+        self.env.cr.execute("""
+            INSERT INTO karbura_notification_outbox (sms_id, attempts, lease_until)
+            SELECT unnest(%s::int[]), 0, %s
+            ON CONFLICT (sms_id) DO NOTHING
+        """, [list(sms_ids), at])
+        inserted = self.env.cr.rowcount
+        if not inserted:
+            return 0
+        _logger.info("Queued %s SMS in the outbox", inserted)
+        self.env.ref('karbura_notification.ir_cron_sms_outbox_dispatch').sudo()._trigger(at=at)
+        return inserted
+
+    @api.model
+    def _claim(self, limit):
+        """Lease up to ``limit`` rows that no worker holds.
+
+        Rows locked by a concurrent claim are skipped rather than waited for,
+        so every worker gets its own rows. The caller commits the claim before
+        sending, so that the lease stays visible to the other workers.
+
+        Returns:
+            list: (outbox row ID, SMS ID, attempts) tuples
+        """
+        owner = '%s:%s:%s' % (socket.gethostname(), os.getpid(), threading.get_ident())
+        self.env.cr.execute("""
+            UPDATE karbura_notification_outbox AS o
+               SET lease_until = (now() AT TIME ZONE 'UTC') + make_interval(secs => %s),
+                   lease_owner = %s,
+                   attempts = o.attempts + 1
+             WHERE o.id IN (
+                    SELECT id FROM karbura_notification_outbox
+                     WHERE lease_until IS NULL OR lease_until < (now() AT TIME ZONE 'UTC')
+                     ORDER BY id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED)
+         RETURNING o.id, o.sms_id, o.attempts
+        """, [LEASE_SECONDS, owner, limit])
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _dispatch(self):
+        """Claim and send batches of queued SMS until the outbox is empty.
+
+        Each batch is leased and committed, then its rows are deleted and its
+        SMS sent by ``sms.sms._send`` in one transaction, in which a failed
+        send may queue its SMS again for a retry. If the send raises, the
+        batch is rolled back to its savepoint, and if the worker dies
+        meanwhile, nothing is committed either: in both cases the lease
+        expires and another worker takes the rows over, including SMS left in
+        'process' state; after ``MAX_ATTEMPTS`` leases an SMS is marked as a
+        dead letter instead.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        deadline = time.monotonic() + DISPATCH_TIME_BUDGET
+        dispatched = 0
+        while time.monotonic() < deadline:
+            claimed = self._claim(CLAIM_BATCH_SIZE)
+            if not claimed:
+                break
+            if auto_commit:
+                self.env.cr.commit()
+            try:
+                # A failed batch leaves nothing behind but its lease, which expires
+                with self.env.cr.savepoint():
+                    self._send_claimed(claimed)
+            except Exception:
+                _logger.exception("Failed dispatching %s SMS of the outbox, left for a later attempt",
+                                  len(claimed))
+            else:
+                dispatched += len(claimed)
+            if auto_commit:
+                self.env.cr.commit()
+
+        if dispatched:
+            _logger.info("Dispatched %s SMS from the outbox", dispatched)
+        if auto_commit:
+            self._trigger_next_dispatch()
+        return dispatched
+
+    @api.model
+    def _send_claimed(self, claimed):
+        """Delete the claimed rows and send their SMS, or give them up."""
+        sms = self.env['sms.sms'].sudo().browse([sms_id for _id, sms_id, _attempts in claimed]).exists()
+        sendable = sms.filtered(lambda r: r.state in ('outgoing', 'process'))
+        given_up = sendable.browse([
+            sms_id for _id, sms_id, attempts in claimed if attempts > MAX_ATTEMPTS
+        ]) & sendable
+        if given_up:
+            _logger.warning("Giving up %s SMS after %s send attempts", len(given_up), MAX_ATTEMPTS)
+            given_up._update_sms_state_and_trackers('error', failure_type='sms_server')
+            given_up.write({'dead_letter': True, 'idempotency_key': False})
+
+        self.env.cr.execute("DELETE FROM karbura_notification_outbox WHERE id = ANY(%s)",
+                            [[row_id for row_id, _sms_id, _attempts in claimed]])
+        if sendable - given_up:
+            (sendable - given_up)._send(unlink_failed=False, unlink_sent=True, raise_exception=False)
+
+    @api.model
+    def _trigger_next_dispatch(self):
+        """Wake a dispatcher up for the rows left over or whose lease expires first."""
+        self.env.cr.execute("""
+            SELECT min(COALESCE(lease_until, now() AT TIME ZONE 'UTC'))
+              FROM karbura_notification_outbox
+        """)
+        next_dispatch = self.env.cr.fetchone()[0]
+        if next_dispatch:
+            self.env.ref('karbura_notification.ir_cron_sms_outbox_dispatch').sudo()._trigger(at=next_dispatch)
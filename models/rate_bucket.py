@@ -0,0 +1,53 @@
+from odoo import fields, models
+
+
+class RateBucket(models.Model):
+    _name = 'karbura.notification.rate.bucket'
+    _description = 'SMS Provider Rate Limit Bucket'
+    _log_access = False
+
+    provider_id = fields.Many2one('karbura.notification.provider', string='Provider', required=True, ondelete='cascade')
+    bucket = fields.Selection([
+        ('request', 'Requests'),
+        ('message', 'Messages'),
+    ], string='Bucket', required=True)
+    tokens = fields.Float(string='Tokens', digits=(16, 4))
+    updated_at = fields.Float(string='Updated At (epoch)', digits=(16, 6))
+
+    _sql_constraints = [
+        ('provider_bucket_uniq', 'unique(provider_id, bucket)', 'A provider can only have one bucket of each kind.'),
+    ]
+
+    def _take(self, provider_id, bucket, rate, amount):
+        """Take ``amount`` tokens from a bucket refilled at ``rate`` per second.
+
+        The refill and the withdrawal are done by a single upsert on a
+        dedicated cursor that is committed right away, so the bucket is
+        shared by every worker without holding a lock. Tokens may go below
+        zero: the caller then owns a reservation and must wait until the
+        bucket would have refilled.
+
+        Returns:
+            float: Number of seconds to wait before using the tokens
+        """
+        capacity = max(rate, 1.0)
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO karbura_notification_rate_bucket AS b (provider_id, bucket, tokens, updated_at)
+                VALUES (%(provider_id)s, %(bucket)s, %(capacity)s - %(amount)s,
+                        extract(epoch FROM clock_timestamp()))
+                ON CONFLICT (provider_id, bucket) DO UPDATE
+                   SET tokens = LEAST(%(capacity)s,
+                                      b.tokens + GREATEST(EXCLUDED.updated_at - b.updated_at, 0) * %(rate)s
+                                ) - %(amount)s,
+                       updated_at = EXCLUDED.updated_at
+                RETURNING tokens
+            """, {
+                'provider_id': provider_id,
+                'bucket': bucket,
+                'capacity': capacity,
+                'rate': rate,
+                'amount': amount,
+            })
+            tokens = cr.fetchone()[0]
+        return -tokens / rate if tokens < 0 else 0.0
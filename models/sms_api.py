@@ -2,11 +2,64 @@ import json
 import logging
 import requests
 import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 from odoo import models, api
 from odoo.exceptions import UserError
 
+from ..tools import metrics
+from ..tools.adaptive import AimdController, parse_retry_after
+from ..tools.json_path import compile_path
+from ..tools.payload_template import compile_template
+from ..tools.sms_logging import lazy_json, lazy_json_body, lazy_response, lazy_text, log_sampled, set_sample_rate
+
 _logger = logging.getLogger(__name__)
 
+# Keep-alive HTTP sessions shared by all requests of a worker, keyed by
+# (database, provider id). Each entry remembers the provider write_date it was
+# built from so a change made by another worker is picked up on next use.
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Reachability of provider hosts shared by all threads of a worker, keyed by
+# (host, port) and holding (reachable, checked_at, probing). Answers are served
+# from memory; stale entries are refreshed by a background probe.
+_reachability = {}
+_reachability_lock = threading.Lock()
+REACHABLE_TTL = 60
+UNREACHABLE_TTL = 10
+PROBE_TIMEOUT = 2
+
+# Adaptive operating points of the providers in this worker, keyed by
+# (database, provider id) and holding the write_date they were configured from.
+# Unlike sessions, they survive a change of the provider: only their bounds move.
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def _set_reachability(key, reachable):
+    with _reachability_lock:
+        previous = _reachability.get(key)
+        _reachability[key] = (reachable, time.monotonic(), False)
+    if previous is None or previous[0] != reachable:
+        log = _logger.info if reachable else _logger.warning
+        log("SMS provider host %s:%s is %s", key[0], key[1], 'reachable' if reachable else 'unreachable')
+
+
+def _probe_host(key):
+    """Open a TCP connection to the provider host and record the outcome."""
+    try:
+        socket.create_connection(key, timeout=PROBE_TIMEOUT).close()
+        reachable = True
+    except OSError:
+        reachable = False
+    _set_reachability(key, reachable)
+    return reachable
+
+
 class SMSApi(models.AbstractModel):
     _name = 'karbura.notification.sms.api'
     _description = 'SMS API Integration'
@@ -14,47 +67,31 @@ class SMSApi(models.AbstractModel):
     @api.model
     def _prepare_request(self, provider, recipient, message):
         """Prepare the request headers and payload."""
-        _logger.info("Preparing SMS request for recipient: %s", recipient)
-        headers = {}
-        
-        # Add extra headers
-        for header in provider.extra_headers:
-            headers[header.name] = header.value
-        _logger.debug("Request headers: %s", headers)
+        log_sampled(_logger, logging.DEBUG, "Preparing SMS request for recipient: %s", recipient)
+        config = provider._get_config()
+        headers = self._prepare_headers(config)
+        _logger.debug("Request headers: %s", lazy_json(headers))
 
         # Prepare payload from template
-        extra_fields = {field.name: field.value for field in provider.extra_fields}
-        _logger.debug("Extra fields: %s", extra_fields)
-        
-        try:
-            payload_template = json.loads(provider.payload_template or '{}')
-            payload = self._format_payload(payload_template, recipient, message, extra_fields)
-            _logger.debug("Formatted payload: %s", payload)
-        except json.JSONDecodeError as e:
-            _logger.error("Failed to parse payload template: %s", str(e))
-            raise UserError(f'Invalid payload template: {str(e)}')
+        extra_fields = dict(config.extra_fields)
+        _logger.debug("Extra fields: %s", lazy_json(extra_fields))
 
+        if config.payload_renderer is None:
+            raise UserError('Invalid payload template')
+        params = dict(extra_fields, recipient=recipient, message=message)
         if headers.get('Content-Type') == 'application/json':
-            payload = json.dumps(payload)
+            payload = config.payload_renderer.render_bytes(params).decode()
+            _logger.debug("Formatted payload: %s", lazy_text(payload))
+        else:
+            payload = config.payload_renderer.render(params)
+            _logger.debug("Formatted payload: %s", lazy_json(payload))
 
         return headers, payload
 
     @api.model
     def _format_payload(self, template, recipient, message, extra_fields):
         """Format the payload template with values."""
-        if isinstance(template, dict):
-            return {k: self._format_payload(v, recipient, message, extra_fields) 
-                   for k, v in template.items()}
-        elif isinstance(template, list):
-            return [self._format_payload(v, recipient, message, extra_fields) 
-                   for v in template]
-        elif isinstance(template, str):
-            return template.format(
-                recipient=recipient,
-                message=message,
-                **extra_fields
-            )
-        return template
+        return compile_template(template).render(dict(extra_fields, recipient=recipient, message=message))
 
     @api.model
     def _find_success_in_response(self, response_data):
@@ -74,155 +111,328 @@ class SMSApi(models.AbstractModel):
         return None
 
     @api.model
-    def _replace_template_params(self, provider, template, base_params=None):
-        """
-        Replace template parameters with provided values.
-        
+    def _get_template_params(self, config, base_params=None):
+        """Return the placeholder values of the request templates.
+
+        The Extra Fields of the provider override the built-in values, e.g.
+        credentials kept as ``username`` and ``password`` extra fields.
+
         Args:
-            provider: SMS provider record
-            template (str): JSON template string with placeholders
-            base_params (dict): Base parameters (recipient, message, messageid, etc.)
-        
-        Returns:
-            dict: Parsed template with placeholders replaced
+            config: SMS provider configuration snapshot
+            base_params (dict): Base parameters (to, body, messageid, messageids)
         """
-        _logger.info("=== Template Parameter Replacement ===")
-        
-        # Convert template to string for replacement
-        template_str = json.dumps(template)
-        _logger.info("Original template: %s", template_str)
-        
-        # Start with base parameters
         base_params = base_params or {}
-        replacements = {
+        params = {
             # SMS send parameters
-            '{recipient}': base_params.get('to', ''),
-            '{message}': base_params.get('body', ''),
-            # Status check parameters
-            '{messageid}': base_params.get('messageid', ''),
+            'recipient': base_params.get('to', ''),
+            'message': base_params.get('body', ''),
+            # Status check parameters: a "{messageids}" value becomes a JSON
+            # array, inside a longer string it is a comma-separated list
+            'messageid': base_params.get('messageid', ''),
+            'messageids': list(base_params.get('messageids') or []),
             # Authentication parameters
-            '{username}': provider.username or '',
-            '{password}': provider.password or ''
-        }
-        
-        # Add provider's extra fields
-        for extra_field in provider.extra_fields:
-            placeholder = '{' + extra_field.name + '}'
-            replacements[placeholder] = extra_field.value
-            
-        # Log replacement mapping (excluding sensitive data)
-        safe_replacements = {
-            k: '***' if any(s in k.lower() for s in ['password', 'token', 'key']) else v 
-            for k, v in replacements.items()
+            'username': config.username,
+            'password': config.password,
         }
-        _logger.info("Replacement mapping: %s", safe_replacements)
-        
-        # Perform replacements
-        for placeholder, value in replacements.items():
-            template_str = template_str.replace(placeholder, str(value))
-        
-        # Parse back to JSON
-        try:
-            result = json.loads(template_str)
-            _logger.info("Final template: %s", 
-                        {k: '***' if any(s in k.lower() for s in ['password', 'token', 'key']) else v 
-                         for k, v in result.items()})
-            return result
-        except json.JSONDecodeError as e:
-            _logger.error("Error parsing replaced template: %s", str(e))
-            _logger.error("Problematic template string: %s", template_str)
-            return template
+        # Extra fields come last, they may override the values above
+        params.update(config.extra_fields)
+        return params
+
+    @api.model
+    def _replace_template_params(self, config, renderer, base_params=None):
+        """Fill a compiled request template of the provider.
+
+        Args:
+            config: SMS provider configuration snapshot
+            renderer: Compiled template (``config.payload_renderer`` or ``config.status_renderer``)
+            base_params (dict): Base parameters (to, body, messageid, messageids)
+
+        Returns:
+            The template filled as a JSON-compatible value
+        """
+        return renderer.render(self._get_template_params(config, base_params))
+
+    @api.model
+    def _render_request_body(self, config, renderer, base_params=None, extra=None):
+        """Return the encoded JSON body of a request, see ``_replace_template_params``.
+
+        Args:
+            extra (dict): Fields added to the top-level object of the body
+        """
+        return renderer.render_bytes(self._get_template_params(config, base_params), extra)
 
     @api.model
     def _extract_message_ids(self, response_data, message_id_path):
         """Extract message IDs from the response using the configured path."""
-        message_ids = []
-        
-        def get_value_by_path(data, path):
-            """Get a value from nested dictionaries/lists using a dot-separated path."""
-            try:
-                current = data
-                parts = path.split('.')
-                
-                for part in parts:
-                    # Handle array indexing
-                    if '[' in part and ']' in part:
-                        array_part = part.split('[')[0]
-                        index = int(part.split('[')[1].split(']')[0])
-                        current = current[array_part][index]
-                    else:
-                        current = current[part]
-                
-                # Handle both single values and lists
-                if isinstance(current, list):
-                    return [str(item) for item in current]
-                else:
-                    return [str(current)]
-                    
-            except (KeyError, IndexError, TypeError, ValueError) as e:
-                _logger.warning("Failed to extract message ID using path %s: %s", path, str(e))
-                return []
-        
-        # Extract message IDs using the configured path
-        message_ids = get_value_by_path(response_data, message_id_path)
-        _logger.info("Extracted message IDs using path %s: %s", message_id_path, message_ids)
-        
+        message_ids = self._get_value_by_path(response_data, message_id_path)
+        _logger.debug("Extracted %s message IDs using path %s", len(message_ids), message_id_path)
+
         return message_ids
 
     @api.model
-    def _check_internet_connection(self):
-        """Check if there is an internet connection by trying to reach a reliable host."""
-        test_hosts = [
-            "8.8.8.8",  # Google DNS
-            "1.1.1.1"   # Cloudflare DNS
-        ]
-        
-        for host in test_hosts:
-            try:
-                # Try to connect to the host's port 53 (DNS)
-                socket.create_connection((host, 53), timeout=3)
-                _logger.debug("Internet connection check successful using %s", host)
-                return True
-            except OSError:
-                continue
-        
-        _logger.warning("No internet connection available")
-        return False
+    def _get_session(self, config):
+        """Return the pooled keep-alive session of the provider for this worker."""
+        key = (self.env.cr.dbname, config.id)
+        write_date = config.write_date
+        with _sessions_lock:
+            entry = _sessions.get(key)
+            if entry and entry[0] == write_date:
+                return entry[1]
+            if entry:
+                entry[1].close()
+            pool_size = max(config.pool_size or 1, config.max_concurrency or 1,
+                            config.adaptive_max_concurrency if config.adaptive_enabled else 1)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = (write_date, session)
+            _logger.debug("Opened HTTP session for provider %s (pool size %s)", config.id, pool_size)
+            return session
+
+    @api.model
+    def _drop_sessions(self, provider_ids):
+        """Close the pooled sessions of the given providers in this worker."""
+        dbname = self.env.cr.dbname
+        with _sessions_lock:
+            for provider_id in provider_ids:
+                entry = _sessions.pop((dbname, provider_id), None)
+                if entry:
+                    entry[1].close()
+
+    @api.model
+    def _get_controller(self, config):
+        """Return the adaptive controller of the provider, or None if it is disabled."""
+        if not config.adaptive_enabled:
+            return None
+        key = (self.env.cr.dbname, config.id)
+        bounds = (config.adaptive_min_recipients, config.adaptive_max_recipients,
+                  config.adaptive_min_concurrency, config.adaptive_max_concurrency,
+                  config.adaptive_target_latency)
+        with _controllers_lock:
+            entry = _controllers.get(key)
+            if entry and entry[0] == config.write_date:
+                return entry[1]
+            if entry:
+                controller = entry[1]
+                controller.configure(*bounds)
+            else:
+                controller = AimdController(*bounds, batch=config.max_recipients_per_request,
+                                            concurrency=config.max_concurrency)
+            _controllers[key] = (config.write_date, controller)
+            return controller
+
+    @api.model
+    def _get_batch_size(self, config):
+        """Return the number of recipients to put in one send request, 0 for no limit."""
+        controller = self._get_controller(config)
+        return controller.batch_size if controller else config.max_recipients_per_request
+
+    @api.model
+    def _get_timeout(self, config):
+        """Return the (connect, read) timeout tuple for requests to the provider."""
+        return (config.connect_timeout or None, config.read_timeout or None)
+
+    @api.model
+    def _get_host_key(self, url):
+        """Return the (host, port) pair a provider URL connects to."""
+        try:
+            parts = urlsplit(url or '')
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            return None
+        if not parts.hostname:
+            return None
+        return (parts.hostname, port)
 
     @api.model
-    def send_sms(self, provider, recipients, message):
+    def _check_provider_reachable(self, url):
+        """Tell whether the host of the given provider URL is reachable.
+
+        The answer comes from the shared reachability state. Only the very
+        first check of a host probes it synchronously; afterwards an expired
+        entry is answered from memory while a background thread refreshes it.
+        """
+        key = self._get_host_key(url)
+        if not key:
+            return False
+        now = time.monotonic()
+        with _reachability_lock:
+            entry = _reachability.get(key)
+            if entry:
+                reachable, checked_at, probing = entry
+                ttl = REACHABLE_TTL if reachable else UNREACHABLE_TTL
+                if probing or now - checked_at < ttl:
+                    return reachable
+                _reachability[key] = (reachable, checked_at, True)
+        if not entry:
+            return _probe_host(key)
+        threading.Thread(target=_probe_host, args=(key,), daemon=True,
+                         name='karbura-sms-probe').start()
+        return reachable
+
+    @api.model
+    def _mark_reachability(self, url, reachable):
+        """Record the reachability observed by an actual request to the provider."""
+        key = self._get_host_key(url)
+        if key:
+            _set_reachability(key, reachable)
+
+    @api.model
+    def send_sms(self, provider, recipients, message, idempotency_key=None):
         """Send SMS to multiple recipients in a batch.
         
         Args:
             provider: SMS provider configuration
             recipients: Comma-separated list of phone numbers
             message: SMS message text
+            idempotency_key: Key identifying the request across its retries
             
         Returns:
             dict: Sending results with:
                 - success: Overall sending status
                 - response_data: Full response JSON from provider
                 - failed_recipients: List of recipients that failed
+                - retryable: Whether the failure is transient (timeout, HTTP 5xx or 429)
         """
-        _logger.info("=== Starting SMS Send ===")
-        _logger.info("Provider: %s", provider.name)
-        _logger.info("Recipients: %s", recipients)
-        
-        # Check internet connection first
-        if not self._check_internet_connection():
-            _logger.error("Cannot send SMS: No internet connection")
-            return {'success': False}
+        _logger.debug("Sending SMS through %s to %s recipients", provider.name, len(recipients.split(',')))
+
+        config = provider._get_config()
+        if not self._check_provider_reachable(config.base_url):
+            _logger.error("Cannot send SMS: provider %s is unreachable", config.name)
+            return {'success': False, 'retryable': True}
         
+        self._throttle(config, messages=len(recipients.split(',')))
+        controller = self._get_controller(config)
+        if not controller:
+            return self._post_sms(config, self._get_session(config), recipients, message, idempotency_key)
+        controller.acquire(self._get_slot_timeout(config))
         try:
-            # Load payload template
+            return self._post_sms(config, self._get_session(config), recipients, message, idempotency_key)
+        finally:
+            controller.release()
+
+    @api.model
+    def _dispatch_sms(self, provider, jobs):
+        """Send several independent SMS requests concurrently.
+
+        Requests are run by a pool of at most ``max_concurrency`` threads of
+        the provider. With adaptive batching, the pool is sized for the
+        ceiling and requests are only released while the current operating
+        point allows one more in flight. The threads only perform HTTP work on the configuration
+        snapshot: they never touch the environment, so the caller applies the
+        results with its own cursor once they are all collected.
+
+        Args:
+            provider: SMS provider configuration
+            jobs: List of (recipients, message, idempotency key) tuples, one per request
+
+        Returns:
+            list: send_sms results, in the order of the jobs
+        """
+        if not jobs:
+            return []
+        config = provider._get_config()
+        if not self._check_provider_reachable(config.base_url):
+            _logger.error("Cannot send SMS: provider %s is unreachable", config.name)
+            return [{'success': False, 'retryable': True} for _job in jobs]
+
+        session = self._get_session(config)
+        controller = self._get_controller(config)
+        slot_timeout = self._get_slot_timeout(config)
+
+        def post(job):
             try:
-                payload_template = json.loads(provider.payload_template or '{}')
-            except json.JSONDecodeError as e:
-                _logger.error("Failed to parse payload template: %s", str(e))
+                return self._post_sms(config, session, *job)
+            except Exception as e:
+                _logger.exception("Unexpected error while sending SMS: %s", str(e))
+                return {'success': False, 'failure_type': 'sms_server', 'failure_reason': str(e)}
+            finally:
+                if controller:
+                    controller.release()
+
+        def release(job):
+            # Requests are released at the provider's rate and operating point
+            self._throttle(config, messages=len(job[0].split(',')))
+            if controller:
+                controller.acquire(slot_timeout)
+
+        max_workers = config.adaptive_max_concurrency if controller else config.max_concurrency
+        workers = min(max(max_workers, 1), len(jobs))
+        if workers == 1:
+            results = []
+            for job in jobs:
+                release(job)
+                results.append(post(job))
+            return results
+        _logger.info("Dispatching %s SMS requests to %s with %s workers", len(jobs), config.name, workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='karbura-sms') as executor:
+            futures = []
+            for job in jobs:
+                release(job)
+                futures.append(executor.submit(post, job))
+            return [future.result() for future in futures]
+
+    @api.model
+    def _get_slot_timeout(self, config):
+        """Longest wait for an adaptive request slot, after which the request is sent anyway."""
+        return (config.connect_timeout or 0) + (config.read_timeout or 0) or None
+
+    @api.model
+    def _throttle(self, config, messages=0):
+        """Wait until the provider rate limits allow one more request.
+
+        Both the request and the message buckets are shared by all workers of
+        the database (see karbura.notification.rate.bucket).
+        """
+        Bucket = self.env['karbura.notification.rate.bucket'].sudo()
+        wait = 0.0
+        if config.rate_limit_requests > 0:
+            wait = Bucket._take(config.id, 'request', config.rate_limit_requests, 1)
+        if messages and config.rate_limit_messages > 0:
+            wait = max(wait, Bucket._take(config.id, 'message', config.rate_limit_messages, messages))
+        if wait > 0:
+            _logger.debug("Rate limit of provider %s reached, waiting %.3fs", config.name, wait)
+            time.sleep(wait)
+
+    @api.model
+    def _post_sms(self, config, session, recipients, message, idempotency_key=None):
+        """Perform the send request of a batch and interpret the response.
+
+        This only uses the configuration snapshot and the given session, so
+        it can safely run outside of the request thread. The latency and
+        outcome of the request are recorded in the metrics of the worker,
+        and the latency is returned in the ``duration`` key of the result.
+        """
+        start = time.monotonic()
+        result = self._post_sms_request(config, session, recipients, message, idempotency_key)
+        self._record_request(config, 'send', start, result.get('success'))
+        result['duration'] = time.monotonic() - start
+        controller = self._get_controller(config)
+        if controller and controller.record(result['duration'], result.get('success'),
+                                            throttled=result.get('throttled'),
+                                            retry_after=result.get('retry_after')):
+            _logger.info("Provider %s congested, now sending %s recipients per request with %s in flight",
+                         config.name, controller.batch_size, controller.max_in_flight)
+        return result
+
+    @api.model
+    def _record_request(self, config, operation, start, success):
+        """Record the latency and outcome of a request to the provider."""
+        labels = {'provider': config.name, 'operation': operation}
+        metrics.observe('karbura_sms_request_duration_seconds', labels, time.monotonic() - start)
+        metrics.inc('karbura_sms_requests_total', dict(labels, outcome='success' if success else 'failure'))
+
+    @api.model
+    def _post_sms_request(self, config, session, recipients, message, idempotency_key=None):
+        """Send the request of ``_post_sms``."""
+        try:
+            if config.payload_renderer is None:
+                _logger.error("Cannot send SMS: invalid payload template")
                 return {'success': False}
             
             # Prepare headers
-            headers = self._prepare_headers(provider)
+            headers = self._prepare_headers(config)
             
             # Base parameters for template
             base_params = {
@@ -230,27 +440,27 @@ class SMSApi(models.AbstractModel):
                 'body': message
             }
             
-            # Replace template parameters using provider's extra fields
-            payload = self._replace_template_params(provider, payload_template, base_params)
+            extra = None
+            if idempotency_key:
+                if config.idempotency_header:
+                    headers[config.idempotency_header] = idempotency_key
+                if config.idempotency_field:
+                    extra = {config.idempotency_field: idempotency_key}
+            # Fill the compiled template using provider's extra fields
+            body = self._render_request_body(config, config.payload_renderer, base_params, extra)
             
-            # Log detailed request information
-            _logger.info("=== API Request Details ===")
-            _logger.info("Request URL: %s", provider.base_url)
-            _logger.info("Request Headers: %s", json.dumps(headers, indent=2))
-            _logger.info("Request Payload: %s", json.dumps(payload, indent=2))
+            _logger.debug("SMS request to %s: headers %s, payload %s",
+                          config.base_url, lazy_json(headers), lazy_json_body(body))
             
             # Make API request
-            response = requests.post(
-                provider.base_url, 
-                json=payload, 
-                headers=headers
+            response = session.post(
+                config.base_url,
+                data=body,
+                headers=self._with_json_content_type(headers),
+                timeout=self._get_timeout(config)
             )
             
-            # Log full response details
-            _logger.info("=== API Response Details ===")
-            _logger.info("Response Status Code: %s", response.status_code)
-            _logger.info("Response Headers: %s", json.dumps(dict(response.headers), indent=2))
-            _logger.info("Response Body (full): %s", response.text)
+            _logger.debug("SMS response from %s: %s", config.name, lazy_response(response))
             
             response.raise_for_status()
             
@@ -260,14 +470,12 @@ class SMSApi(models.AbstractModel):
                 # Check for success
                 success = self._find_success_in_response(response_json)
                 
-                # Log parsing details
-                _logger.info("=== Response Parsing ===")
-                _logger.info("Success Value: %s", success)
-                _logger.info("Parsed Response JSON: %s", json.dumps(response_json, indent=2))
+                _logger.debug("Success value in SMS response: %s", success)
                 
                 if success is not None:
                     if success:
-                        _logger.info("SMS sent successfully to %s", recipients)
+                        log_sampled(_logger, logging.INFO, "SMS sent successfully to %s recipients",
+                                    len(recipients.split(',')))
                         return {
                             'success': True,
                             'response_data': response_json,
@@ -285,7 +493,7 @@ class SMSApi(models.AbstractModel):
                         }
                 
                 # If no success field found, assume success if HTTP status was 200
-                _logger.info("No explicit success field found, assuming success")
+                _logger.debug("No explicit success field found, assuming success")
                 return {
                     'success': True,
                     'response_data': response_json,
@@ -297,10 +505,17 @@ class SMSApi(models.AbstractModel):
                 return {'success': False, 'failed_recipients': recipients.split(',')}
                      
         except requests.RequestException as e:
+            if isinstance(e, (requests.ConnectionError, requests.ConnectTimeout)):
+                self._mark_reachability(config.base_url, False)
             _logger.error("SMS sending failed: %s", str(e))
-            return {'success': False, 'failed_recipients': recipients.split(',')}
-        finally:
-            _logger.info("=== Finished SMS Send ===")
+            result = {'success': False, 'failed_recipients': recipients.split(','), 'failure_reason': str(e)}
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code == 429:
+                result.update(throttled=True, retry_after=parse_retry_after(e.response.headers.get('Retry-After')))
+            # The request may not have reached the provider, or it may accept it later
+            result['retryable'] = (isinstance(e, (requests.Timeout, requests.ConnectionError))
+                                   or status_code == 429 or (status_code or 0) >= 500)
+            return result
 
     @api.model
     def check_sms_status(self, provider, message_id):
@@ -315,174 +530,200 @@ class SMSApi(models.AbstractModel):
                 - success: Whether the status check succeeded
                 - delivered: Whether the message was delivered
         """
-        _logger.info("=== Checking SMS Status ===")
-        _logger.info("Provider: %s", provider.name)
-        _logger.info("Message ID: %s", message_id)
-        
-        # Check internet connection first
-        if not self._check_internet_connection():
-            _logger.error("Cannot check SMS status: No internet connection")
+        log_sampled(_logger, logging.DEBUG, "Checking status of SMS %s with %s", message_id, provider.name)
+        config = provider._get_config()
+        response_json = self._post_status(config, {'messageid': message_id})
+        if response_json is None:
             return {'success': False}
-        
+
+        # Extract status using the same path mechanism
+        status_values = self._get_value_by_path(response_json, config.status_path)
+
+        if not status_values:
+            return {'success': True, 'delivered': False}
+
+        # Check if status indicates delivery
+        status = status_values[0]  # Use first status if multiple
+        log_sampled(_logger, logging.DEBUG, "Status of SMS %s: %s", message_id, status)
+
+        # Consider message delivered if not in waited status
+        return {'success': True, 'delivered': status not in config.waited_statuses}
+
+    @api.model
+    def check_sms_status_batch(self, provider, message_ids):
+        """Check the delivery status of several SMS messages in one request.
+
+        The status template receives the IDs through the ``{messageids}``
+        placeholder. Statuses found at ``status_field`` are matched to the
+        IDs found at ``status_message_id_field`` or, when the response does
+        not repeat the IDs, to the requested IDs in order.
+
+        Args:
+            provider: SMS provider configuration
+            message_ids: Provider's message IDs to check
+
+        Returns:
+            dict: Status check results with:
+                - success: Whether the status check succeeded
+                - statuses: Dict of message ID to {'delivered': bool}, for
+                  the messages whose status could be determined
+        """
+        _logger.debug("Checking the status of %s SMS with %s", len(message_ids), provider.name)
+        config = provider._get_config()
+        response_json = self._post_status(config, {'messageids': list(message_ids)})
+        if response_json is None:
+            return {'success': False}
+
+        status_values = self._get_value_by_path(response_json, config.status_path)
+        response_ids = self._get_value_by_path(response_json, config.status_message_id_path)
+        if response_ids and len(response_ids) == len(status_values):
+            pairs = zip(response_ids, status_values)
+        elif len(status_values) == len(message_ids):
+            pairs = zip(message_ids, status_values)
+        else:
+            _logger.warning("Cannot match %s statuses to %s message IDs in status response of %s",
+                            len(status_values), len(message_ids), config.name)
+            return {'success': True, 'statuses': {}}
+
+        requested = set(message_ids)
+        statuses = {
+            message_id: {'delivered': status not in config.waited_statuses}
+            for message_id, status in pairs
+            if message_id in requested
+        }
+        _logger.debug("Determined the status of %s of %s messages", len(statuses), len(message_ids))
+        return {'success': True, 'statuses': statuses}
+
+    @api.model
+    def parse_delivery_receipts(self, provider, data):
+        """Read the delivery receipts pushed by a provider.
+
+        Statuses found at ``dlr_status_field`` are matched in order to the
+        message IDs found at ``dlr_message_id_field``, so one payload may
+        hold any number of receipts. Statuses that are neither delivered
+        nor failed (e.g. intermediate acknowledgements) are ignored.
+
+        Args:
+            provider: SMS provider configuration
+            data: Decoded receipt payload
+
+        Returns:
+            dict: Message ID to final state, 'delivered' or 'failed'
+        """
+        config = provider._get_config()
+        message_ids = self._get_value_by_path(data, config.dlr_message_id_path)
+        status_values = self._get_value_by_path(data, config.dlr_status_path)
+        if len(message_ids) != len(status_values):
+            _logger.warning("Cannot match %s statuses to %s message IDs in receipts of %s",
+                            len(status_values), len(message_ids), config.name)
+            return {}
+
+        receipts = {}
+        for message_id, status in zip(message_ids, status_values):
+            if not message_id:
+                continue
+            if status in config.dlr_delivered_statuses:
+                receipts[message_id] = 'delivered'
+            elif status in config.dlr_failed_statuses:
+                receipts[message_id] = 'failed'
+        _logger.info("Received %s final delivery receipts out of %s from %s",
+                     len(receipts), len(message_ids), config.name)
+        return receipts
+
+    @api.model
+    def _post_status(self, config, base_params):
+        """Send a status request and return its parsed JSON response.
+
+        Returns:
+            The decoded response, or None if the request failed
+        """
+        start = time.monotonic()
+        response_json = self._post_status_request(config, base_params)
+        self._record_request(config, 'status', start, response_json is not None)
+        return response_json
+
+    @api.model
+    def _post_status_request(self, config, base_params):
+        """Send the request of ``_post_status``."""
+        if not self._check_provider_reachable(config.status_url):
+            _logger.error("Cannot check SMS status: provider %s is unreachable", config.name)
+            return None
+        if config.status_renderer is None:
+            _logger.error("Cannot check SMS status: invalid status template")
+            return None
+
         try:
-            # Load status template
-            try:
-                status_template = json.loads(provider.status_body_template or '{}')
-                _logger.info("Status template: %s", status_template)
-            except json.JSONDecodeError as e:
-                _logger.error("Failed to parse status template: %s", str(e))
-                return {'success': False}
-            
             # Prepare headers
-            headers = self._prepare_headers(provider)
-            
-            # Base parameters for template
-            base_params = {
-                'messageid': message_id,
-                'username': provider.username,
-                'password': provider.password
-            }
-            
-            # Replace template parameters using provider's extra fields
-            payload = self._replace_template_params(provider, status_template, base_params)
-            _logger.info("Status check payload: %s", payload)
-            
+            headers = self._prepare_headers(config)
+
+            # Fill the compiled template using provider's extra fields
+            body = self._render_request_body(config, config.status_renderer, base_params)
+            _logger.debug("Status check payload: %s", lazy_json_body(body))
+
             # Make API request
-            response = requests.post(
-                provider.status_url,
-                json=payload,
-                headers=headers
+            self._throttle(config)
+            response = self._get_session(config).post(
+                config.status_url,
+                data=body,
+                headers=self._with_json_content_type(headers),
+                timeout=self._get_timeout(config)
             )
-            
+
             response.raise_for_status()
             response_json = response.json()
-            _logger.info("Status check response: %s", response_json)
-            
-            # Extract status using the same path mechanism
-            status_values = self._get_value_by_path(response_json, provider.status_field)
-            _logger.info("Extracted status values: %s", status_values)
-            
-            if not status_values:
-                return {'success': True, 'delivered': False}
-            
-            # Check if status indicates delivery
-            status = status_values[0]  # Use first status if multiple
-            waited_statuses = json.loads(provider.status_waited or '[]')
-            
-            _logger.info("Status: %s, Waited statuses: %s", status, waited_statuses)
-            
-            if status in waited_statuses:
-                _logger.info("Message is in waited status")
-                return {'success': True, 'delivered': False}
-            
-            # Consider message delivered if not in waited status
-            return {'success': True, 'delivered': True}
-                
+            _logger.debug("Status check response: %s", lazy_json(response_json))
+            return response_json
+
         except requests.RequestException as e:
+            if isinstance(e, (requests.ConnectionError, requests.ConnectTimeout)):
+                self._mark_reachability(config.status_url, False)
             _logger.error("Status check request failed: %s", str(e))
-            return {'success': False}
+            return None
         except Exception as e:
             _logger.error("Status check failed: %s", str(e))
-            return {'success': False}
-        finally:
-            _logger.info("=== Completed SMS Status Check ===")
+            return None
 
+    @api.model
     def _get_value_by_path(self, data, path):
-        """Get a value from nested dictionaries/lists using a dot-separated path.
-        Returns a list of values found at the path."""
-        _logger.info("=== Extracting value ===")
-        _logger.info("Looking for path: %s in data: %s", path, data)
-        
-        def search_recursively(d, target_key):
-            """Search for key recursively in nested dictionaries and lists.
-            Returns a list of all matching values."""
-            _logger.info("Searching recursively in: %s for key: %s", d, target_key)
-            results = []
-            
-            if isinstance(d, dict):
-                for key, value in d.items():
-                    _logger.info("Checking dict key: %s", key)
-                    if key == target_key:
-                        _logger.info("Found direct match! Key: %s, Value: %s", key, value)
-                        results.append(value)
-                    
-                    # Recurse into nested structures
-                    if isinstance(value, (dict, list)):
-                        _logger.info("Recursing into nested structure: %s", value)
-                        nested_results = search_recursively(value, target_key)
-                        if nested_results:
-                            results.extend(nested_results)
-                            
-            elif isinstance(d, list):
-                _logger.info("Searching in list of length: %s", len(d))
-                for item in d:
-                    if isinstance(item, (dict, list)):
-                        _logger.info("Recursing into list item: %s", item)
-                        nested_results = search_recursively(item, target_key)
-                        if nested_results:
-                            results.extend(nested_results)
-            
-            return results
-        
-        try:
-            # If no dots in path, search recursively through all nested structures
-            if '.' not in path:
-                _logger.info("No dots in path, searching recursively for key: %s", path)
-                results = search_recursively(data, path)
-                if results:
-                    _logger.info("Found values recursively: %s", results)
-                    return [str(r) if r is not None else None for r in results]
-                _logger.info("Key %s not found in any level", path)
-                return []
-            
-            # Handle dot notation path
-            _logger.info("Path contains dots, traversing: %s", path)
-            current = data
-            parts = path.split('.')
-            results = []
-            
-            # Special handling for the last part to collect all values
-            *path_parts, last_part = parts
-            
-            # Navigate to the parent level
-            for part in path_parts:
-                _logger.info("Processing part: %s, current data: %s", part, current)
-                # Handle array indexing
-                if '[' in part and ']' in part:
-                    array_part = part.split('[')[0]
-                    index = int(part.split('[')[1].split(']')[0])
-                    _logger.info("Array access - key: %s, index: %s", array_part, index)
-                    current = current[array_part][index]
-                else:
-                    _logger.info("Dict access - key: %s", part)
-                    current = current[part]
-                _logger.info("After access - value: %s", current)
-            
-            # At the final level, collect all matching values
-            if isinstance(current, list):
-                for item in current:
-                    if isinstance(item, dict) and last_part in item:
-                        value = item[last_part]
-                        _logger.info("Found value in list item: %s", value)
-                        results.append(value)
-            elif isinstance(current, dict) and last_part in current:
-                value = current[last_part]
-                _logger.info("Found value in dict: %s", value)
-                if isinstance(value, list):
-                    results.extend(value)
-                else:
-                    results.append(value)
-            
-            _logger.info("Found values at path: %s", results)
-            return [str(r) if r is not None else None for r in results]
-                
-        except (KeyError, IndexError, TypeError, ValueError) as e:
-            _logger.warning("Failed to get value using path %s: %s", path, str(e))
+        """Get the values found at a response path.
+
+        Args:
+            data: Parsed JSON response
+            path: Compiled path (see ``tools.json_path``) or path expression
+
+        Returns:
+            list: Matched values as strings (None for null values)
+        """
+        if not path:
             return []
+        if isinstance(path, str):
+            try:
+                path = compile_path(path)
+            except ValueError as e:
+                _logger.warning("Failed to get value using path %s: %s", path, str(e))
+                return []
+        return path.find_strings(data)
+
+    @api.model
+    def _refresh_log_settings(self):
+        """Apply the per-message log sample rate of the database.
+
+        The rate is the ``karbura_notification.log_sample_rate`` system
+        parameter, between 0 and 1; all per-message logs are kept by default.
+        """
+        rate = self.env['ir.config_parameter'].sudo().get_param('karbura_notification.log_sample_rate', '1')
+        try:
+            set_sample_rate(float(rate))
+        except ValueError:
+            _logger.warning("Invalid karbura_notification.log_sample_rate: %s", rate)
+
+    @api.model
+    def _prepare_headers(self, config):
+        return dict(config.headers)
 
     @api.model
-    def _prepare_headers(self, provider):
-        headers = {}
-        for header in provider.extra_headers:
-            headers[header.name] = header.value
+    def _with_json_content_type(self, headers):
+        """Add the JSON content type to the headers of a pre-encoded body, unless they set one."""
+        if not any(name.lower() == 'content-type' for name in headers):
+            headers['Content-Type'] = 'application/json'
         return headers
@@ -1,5 +1,79 @@
-from odoo import fields, models, api
-from odoo.exceptions import UserError
+import json
+import logging
+import secrets
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from odoo import fields, models, api, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..tools.json_path import compile_path
+from ..tools.payload_template import compile_template
+from ..tools.prefix_trie import PrefixTrie, digits_of
+
+_logger = logging.getLogger(__name__)
+
+# Immutable snapshot of the effective configuration of a provider, as used by
+# the SMS API on every send and status check.
+ProviderConfig = namedtuple('ProviderConfig', [
+    'id', 'name', 'write_date',
+    'base_url', 'status_url',
+    'connect_timeout', 'read_timeout', 'pool_size',
+    'max_recipients_per_request', 'max_payload_bytes', 'max_segments_per_request', 'max_concurrency',
+    'rate_limit_requests', 'rate_limit_messages',
+    'adaptive_enabled', 'adaptive_min_recipients', 'adaptive_max_recipients',
+    'adaptive_min_concurrency', 'adaptive_max_concurrency', 'adaptive_target_latency',
+    'retry_max_attempts', 'retry_base_delay', 'retry_max_delay', 'idempotency_header', 'idempotency_field',
+    'breaker_enabled', 'breaker_error_rate', 'breaker_min_requests', 'breaker_window',
+    'breaker_slow_latency', 'breaker_open_seconds',
+    'username', 'password',
+    'headers', 'extra_fields',
+    'payload_template', 'status_template', 'payload_renderer', 'status_renderer', 'waited_statuses',
+    'message_id_field', 'status_field',
+    'message_id_path', 'status_path',
+    'status_mode', 'status_batch_size', 'status_message_id_path',
+    'status_check_delay', 'status_check_max_delay', 'status_max_age',
+    'status_check_limit', 'status_check_time_budget',
+    'dlr_enabled', 'dlr_token', 'dlr_message_id_path', 'dlr_status_path',
+    'dlr_delivered_statuses', 'dlr_failed_statuses',
+])
+
+
+
+class ProviderRouter(namedtuple('ProviderRouter', ['trie', 'fallback_id', 'coverage'])):
+    """Routing table of the active providers.
+
+    ``trie`` maps number prefixes to the ID of the provider that serves
+    them at the lowest cost; a local provider without routing rules serves
+    the country of the company. Numbers matching no prefix go to
+    ``fallback_id``: the cheapest international provider, or the first
+    active provider when none is international. ``coverage`` maps the ID
+    of every provider to the number prefixes it may send to, or None for an
+    international provider, which sends anywhere.
+    """
+    __slots__ = ()
+
+    def route(self, number):
+        """Return the ID of the provider serving a number, O(len(number))."""
+        return self.trie.longest_match(number, self.fallback_id)
+
+    def serves(self, provider_id, number):
+        """Tell whether a provider may send to a number, e.g. to fail over to it."""
+        prefixes = self.coverage.get(provider_id, ())
+        return prefixes is None or digits_of(number).startswith(prefixes)
+
+
+# Configuration snapshots of this worker, keyed by (database, provider id).
+# An entry is only reused while its write_date matches the provider's, so a
+# change committed by any worker invalidates it everywhere.
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+# Routing tables of this worker, keyed by database and holding the calling
+# code of the company and the (id, write_date) pairs of the active providers
+# they were built from.
+_router_cache = {}
 
 
 class SMSProvider(models.Model):
@@ -27,6 +101,154 @@ class SMSProvider(models.Model):
         default='["pending", "queued", "sent"]'
     )
 
+    # Connection
+    connect_timeout = fields.Float(
+        string="Connect Timeout (s)",
+        help="Maximum time to wait for the TCP/TLS connection to the provider",
+        default=5.0
+    )
+    read_timeout = fields.Float(
+        string="Read Timeout (s)",
+        help="Maximum time to wait for the provider to answer a request",
+        default=30.0
+    )
+    pool_size = fields.Integer(
+        string="Connection Pool Size",
+        help="Number of keep-alive connections kept open to the provider by each worker",
+        default=10
+    )
+
+    # Batching
+    max_recipients_per_request = fields.Integer(
+        string="Max Recipients per Request",
+        help="Maximum number of phone numbers sent in one request. 0 means no limit.",
+        default=100
+    )
+    max_payload_bytes = fields.Integer(
+        string="Max Payload Size (bytes)",
+        help="Maximum estimated size of one send request. 0 means no limit.",
+        default=65536
+    )
+    max_segments_per_request = fields.Integer(
+        string="Max Segments per Request",
+        help="Maximum number of SMS segments sent in one request, counting every segment of every "
+             "recipient. 0 means no limit.",
+        default=0
+    )
+    max_concurrency = fields.Integer(
+        string="Max Concurrent Requests",
+        help="Number of send requests a worker may have in flight at the same time with this provider",
+        default=4
+    )
+
+    # Rate Limits
+    rate_limit_requests = fields.Float(
+        string="Requests per Second",
+        help="Maximum number of requests sent to the provider per second by all workers together. 0 means no limit.",
+        default=0.0
+    )
+    rate_limit_messages = fields.Float(
+        string="Messages per Second",
+        help="Maximum number of messages sent to the provider per second by all workers together. 0 means no limit.",
+        default=0.0
+    )
+
+    # Adaptive Batching
+    adaptive_enabled = fields.Boolean(
+        string="Adaptive Batching",
+        help="Tune the recipients per request and the concurrent requests from the latency, errors and "
+             "HTTP 429 answers of the provider, between the bounds below. The batching settings above "
+             "are the starting point."
+    )
+    adaptive_min_recipients = fields.Integer(string="Min Recipients per Request", default=10)
+    adaptive_max_recipients = fields.Integer(string="Max Adaptive Recipients per Request", default=1000)
+    adaptive_min_concurrency = fields.Integer(string="Min Concurrent Requests", default=1)
+    adaptive_max_concurrency = fields.Integer(string="Max Adaptive Concurrent Requests", default=16)
+    adaptive_target_latency = fields.Float(
+        string="Target Latency (s)",
+        help="Requests slower than this are treated like errors and shrink the batches. 0 means no target.",
+        default=5.0
+    )
+    adaptive_recipients = fields.Integer(
+        string="Current Recipients per Request", compute='_compute_adaptive_state',
+        help="Operating point of the worker serving this page"
+    )
+    adaptive_concurrency = fields.Integer(
+        string="Current Concurrent Requests", compute='_compute_adaptive_state',
+        help="Operating point of the worker serving this page"
+    )
+    adaptive_latency = fields.Float(
+        string="Average Latency (s)", compute='_compute_adaptive_state',
+        help="Average send request latency seen by the worker serving this page"
+    )
+
+    # Retries
+    retry_max_attempts = fields.Integer(
+        string="Max Send Attempts",
+        help="Messages whose send request timed out, or got an HTTP 5xx or 429 answer, are sent again "
+             "until this many attempts were made, then left in error as dead letters. 1 means no retry.",
+        default=5
+    )
+    retry_base_delay = fields.Integer(
+        string="First Retry Delay (s)",
+        help="Delay before the first retry. It doubles after every attempt, with random jitter.",
+        default=30
+    )
+    retry_max_delay = fields.Integer(
+        string="Max Retry Delay (s)",
+        help="Upper bound of the delay between two attempts",
+        default=3600
+    )
+    idempotency_header = fields.Char(
+        string="Idempotency Key Header",
+        help="HTTP header carrying the idempotency key of each request (e.g. Idempotency-Key). "
+             "A retried request keeps its key, so the provider can drop it if it already got it.",
+        default="Idempotency-Key"
+    )
+    idempotency_field = fields.Char(
+        string="Idempotency Key Field",
+        help="Payload field carrying the idempotency key of each request, for providers that read it from the body"
+    )
+
+    # Circuit Breaker
+    breaker_enabled = fields.Boolean(
+        string="Circuit Breaker",
+        help="Stop sending to the provider while too many of its recent requests fail or time out, "
+             "and send to the next provider by sequence instead",
+        default=True
+    )
+    breaker_error_rate = fields.Float(
+        string="Opening Error Rate",
+        help="Share of failed or slow recent requests (0-1) that opens the circuit",
+        default=0.5
+    )
+    breaker_min_requests = fields.Integer(
+        string="Min Recent Requests",
+        help="The circuit only opens once this many requests were recently made",
+        default=10
+    )
+    breaker_window = fields.Integer(
+        string="Error Rate Window (s)",
+        help="Requests older than this weigh less and less in the error rate",
+        default=60
+    )
+    breaker_slow_latency = fields.Float(
+        string="Slow Request Latency (s)",
+        help="Requests slower than this count as failures. 0 means latency is ignored.",
+        default=10.0
+    )
+    breaker_open_seconds = fields.Integer(
+        string="Open Time (s)",
+        help="Time an open circuit waits before letting a probe request through",
+        default=30
+    )
+    breaker_state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half-Open'),
+    ], string="Circuit State", compute='_compute_breaker_state')
+    breaker_recent_error_rate = fields.Float(string="Recent Error Rate", compute='_compute_breaker_state')
+
     url_type = fields.Selection([
         ('simple_url', 'Simple'),
         ('multi_endpoint_url', 'Multi Endpoint'),
@@ -53,7 +275,8 @@ class SMSProvider(models.Model):
     )
     status_body_template = fields.Text(
         string="Status Body Template (JSON)", 
-        help="Status check payload template in JSON format. Available variables: {messageid}, {username}, {password}",
+        help="Status check payload template in JSON format. Available variables: {messageid} "
+             "(or {messageids} in batch mode), {username}, {password}",
         default='{"messageid": "{messageid}", "username": "{username}", "password": "{password}"}'
     )
     message_id_field = fields.Char(
@@ -68,6 +291,94 @@ class SMSProvider(models.Model):
         required=True,
         default="status"
     )
+    status_mode = fields.Selection([
+        ('single', 'One Message per Request'),
+        ('batch', 'Several Messages per Request'),
+    ], string="Status Check Mode", required=True, default='single',
+        help="In batch mode, the status template receives a list of message IDs through {messageids}")
+    status_batch_size = fields.Integer(
+        string="Max Message IDs per Status Request",
+        default=100
+    )
+    status_message_id_field = fields.Char(
+        string="Status Message ID Field",
+        help="Field name or path to the message ID of each status in a batch status response. "
+             "If the response does not contain it, statuses are matched to the requested IDs in order.",
+        default="messageid"
+    )
+
+    # Status Check Schedule
+    status_check_delay = fields.Integer(
+        string="First Status Check Delay (s)",
+        help="Time between sending a message and its first status check. The delay doubles after every check.",
+        default=60
+    )
+    status_check_max_delay = fields.Integer(
+        string="Max Status Check Delay (s)",
+        help="Upper bound of the delay between two status checks of a message",
+        default=3600
+    )
+    status_max_age = fields.Integer(
+        string="Status Check Max Age (h)",
+        help="Messages still pending after this many hours are marked as expired. 0 means never.",
+        default=72
+    )
+    status_check_limit = fields.Integer(
+        string="Max Status Checks per Run",
+        help="Maximum number of messages checked by one run of the status check cron",
+        default=1000
+    )
+    status_check_time_budget = fields.Integer(
+        string="Status Check Time Budget (s)",
+        help="No new batch of status checks of this provider is started once it has been checked for this "
+             "long in a run of the cron. A run stops at the largest budget of the active providers",
+        default=45
+    )
+
+    # Delivery Receipts
+    dlr_enabled = fields.Boolean(
+        string="Receive Delivery Receipts",
+        help="The provider pushes delivery receipts to the receipt URL. Status checks are then only "
+             "a fallback, made after the max status check delay, for messages without receipt."
+    )
+    dlr_token = fields.Char(string="Receipt Token", copy=False, readonly=True)
+    dlr_url = fields.Char(string="Receipt URL", compute='_compute_dlr_url')
+    dlr_message_id_field = fields.Char(
+        string="Receipt Message ID Field",
+        help="Field name or path to the message ID of each receipt in the pushed payload",
+        default="messageid"
+    )
+    dlr_status_field = fields.Char(
+        string="Receipt Status Field",
+        help="Field name or path to the status of each receipt in the pushed payload. "
+             "Statuses are matched to the message IDs in order.",
+        default="status"
+    )
+    dlr_delivered_statuses = fields.Text(
+        string="Delivered Statuses",
+        help="List of receipt status values meaning the message was delivered (JSON array)",
+        default='["delivered", "DELIVRD"]'
+    )
+    dlr_failed_statuses = fields.Text(
+        string="Failed Statuses",
+        help="List of receipt status values meaning the message will never be delivered (JSON array)",
+        default='["failed", "undelivered", "rejected", "expired", "UNDELIV", "REJECTD", "EXPIRED"]'
+    )
+
+    # Routing
+    country_ids = fields.Many2many(
+        'res.country', string="Countries",
+        help="Numbers of these countries are routed to this provider. A local provider without "
+             "countries or prefixes serves the country of the company."
+    )
+    route_prefixes = fields.Char(
+        string="Number Prefixes",
+        help="Comma-separated international number prefixes routed to this provider (e.g. 2376, 2372)"
+    )
+    cost_per_sms = fields.Float(
+        string="Cost per SMS",
+        help="When several providers serve a number, the cheapest one is used, then the first in sequence"
+    )
 
     # Provider Selection
     is_default = fields.Boolean(string="Default Provider", default=False)
@@ -77,6 +388,61 @@ class SMSProvider(models.Model):
     extra_params_status = fields.One2many('karbura.notification.extra.params.status', 'provider_id', string='Status Params')
     extra_headers = fields.One2many('karbura.notification.extra.header', 'provider_id', string='Extra Headers')
 
+    @api.depends('dlr_token')
+    def _compute_dlr_url(self):
+        for provider in self:
+            if provider.dlr_token and provider.id:
+                provider.dlr_url = '%s/karbura_notification/dlr/%s/%s' % (
+                    provider.get_base_url(), provider.id, provider.dlr_token)
+            else:
+                provider.dlr_url = False
+
+    def _compute_adaptive_state(self):
+        SmsApi = self.env['karbura.notification.sms.api']
+        for provider in self:
+            controller = provider.id and provider.adaptive_enabled and SmsApi._get_controller(provider._get_config())
+            provider.adaptive_recipients = controller.batch_size if controller else provider.max_recipients_per_request
+            provider.adaptive_concurrency = controller.max_in_flight if controller else provider.max_concurrency
+            provider.adaptive_latency = controller.latency if controller else 0.0
+
+    def _compute_breaker_state(self):
+        breakers = self.env['karbura.notification.circuit.breaker'].sudo().search([('provider_id', 'in', self.ids)])
+        breaker_by_provider = {breaker.provider_id.id: breaker for breaker in breakers}
+        for provider in self:
+            breaker = breaker_by_provider.get(provider.id)
+            provider.breaker_state = breaker.state if breaker else 'closed'
+            provider.breaker_recent_error_rate = breaker.failures / breaker.requests if breaker and breaker.requests else 0.0
+
+    @api.constrains('message_id_field', 'status_field', 'status_message_id_field',
+                    'dlr_message_id_field', 'dlr_status_field')
+    def _check_response_paths(self):
+        for provider in self:
+            for field_name in ('message_id_field', 'status_field', 'status_message_id_field',
+                               'dlr_message_id_field', 'dlr_status_field'):
+                if not provider[field_name] and not self._fields[field_name].required:
+                    continue
+                try:
+                    compile_path(provider[field_name])
+                except ValueError as e:
+                    raise ValidationError(_('Invalid %(field)s: %(error)s',
+                                            field=self._fields[field_name].string, error=str(e)))
+
+    @api.constrains('route_prefixes')
+    def _check_route_prefixes(self):
+        for provider in self:
+            for prefix in (provider.route_prefixes or '').split(','):
+                if prefix.strip() and not digits_of(prefix):
+                    raise ValidationError(_('Invalid number prefix: %s', prefix.strip()))
+
+    @api.constrains('adaptive_enabled', 'adaptive_min_recipients', 'adaptive_max_recipients',
+                    'adaptive_min_concurrency', 'adaptive_max_concurrency')
+    def _check_adaptive_bounds(self):
+        for provider in self.filtered('adaptive_enabled'):
+            if not 0 < provider.adaptive_min_recipients <= provider.adaptive_max_recipients:
+                raise ValidationError(_('The recipients per request bounds must be positive and ordered.'))
+            if not 0 < provider.adaptive_min_concurrency <= provider.adaptive_max_concurrency:
+                raise ValidationError(_('The concurrent requests bounds must be positive and ordered.'))
+
     @api.model
     def create(self, vals):
         if vals.get('is_default'):
@@ -84,6 +450,8 @@ class SMSProvider(models.Model):
         else:
             if not self.search([('is_default', '=', True)]):
                 vals['is_default'] = True
+        if vals.get('dlr_enabled') and not vals.get('dlr_token'):
+            vals['dlr_token'] = secrets.token_urlsafe(24)
         return super().create(vals)
 
     def write(self, vals):
@@ -92,7 +460,202 @@ class SMSProvider(models.Model):
         elif 'is_default' not in vals:
             if not self.search([('is_default', '=', True)]):
                 vals['is_default'] = True
-        return super().write(vals)
+        res = super().write(vals)
+        if vals.get('dlr_enabled'):
+            for provider in self.filtered(lambda p: not p.dlr_token):
+                provider.dlr_token = secrets.token_urlsafe(24)
+        self._drop_config_cache(self.ids)
+        self.env['karbura.notification.sms.api']._drop_sessions(self.ids)
+        return res
+
+    def unlink(self):
+        provider_ids = self.ids
+        res = super().unlink()
+        self._drop_config_cache(provider_ids)
+        self.env['karbura.notification.sms.api']._drop_sessions(provider_ids)
+        return res
+
+    def _get_config(self):
+        """Return the cached configuration snapshot of the provider."""
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        write_date = self.write_date
+        config = _config_cache.get(key)
+        if config and config.write_date == write_date:
+            return config
+        config = self._build_config()
+        with _config_cache_lock:
+            _config_cache[key] = config
+        return config
+
+    def _build_config(self):
+        """Read the provider and its lines once and parse every JSON setting."""
+        self.ensure_one()
+        payload_template = self._parse_json_setting('payload_template', '{}')
+        status_template = self._parse_json_setting('status_body_template', '{}')
+        return ProviderConfig(
+            id=self.id,
+            name=self.name,
+            write_date=self.write_date,
+            base_url=self.base_url,
+            status_url=self.status_url,
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            pool_size=self.pool_size,
+            max_recipients_per_request=self.max_recipients_per_request,
+            max_payload_bytes=self.max_payload_bytes,
+            max_segments_per_request=self.max_segments_per_request,
+            max_concurrency=self.max_concurrency,
+            rate_limit_requests=self.rate_limit_requests,
+            rate_limit_messages=self.rate_limit_messages,
+            adaptive_enabled=self.adaptive_enabled,
+            adaptive_min_recipients=self.adaptive_min_recipients,
+            adaptive_max_recipients=self.adaptive_max_recipients,
+            adaptive_min_concurrency=self.adaptive_min_concurrency,
+            adaptive_max_concurrency=self.adaptive_max_concurrency,
+            adaptive_target_latency=self.adaptive_target_latency,
+            retry_max_attempts=self.retry_max_attempts,
+            retry_base_delay=self.retry_base_delay,
+            retry_max_delay=self.retry_max_delay,
+            idempotency_header=self.idempotency_header or '',
+            idempotency_field=self.idempotency_field or '',
+            breaker_enabled=self.breaker_enabled,
+            breaker_error_rate=self.breaker_error_rate,
+            breaker_min_requests=self.breaker_min_requests,
+            breaker_window=self.breaker_window,
+            breaker_slow_latency=self.breaker_slow_latency,
+            breaker_open_seconds=self.breaker_open_seconds,
+            username=self.username or '',
+            password=self.password or '',
+            headers=MappingProxyType({header.name: header.value for header in self.extra_headers}),
+            extra_fields=MappingProxyType({field.name: field.value for field in self.extra_fields}),
+            payload_template=payload_template,
+            status_template=status_template,
+            payload_renderer=compile_template(payload_template) if payload_template is not None else None,
+            status_renderer=compile_template(status_template) if status_template is not None else None,
+            waited_statuses=frozenset(self._parse_json_setting('status_waited', '[]') or ()),
+            message_id_field=self.message_id_field,
+            status_field=self.status_field,
+            message_id_path=self._compile_response_path('message_id_field'),
+            status_path=self._compile_response_path('status_field'),
+            status_mode=self.status_mode,
+            status_batch_size=self.status_batch_size,
+            status_message_id_path=self._compile_response_path('status_message_id_field'),
+            status_check_delay=self.status_check_delay,
+            status_check_max_delay=self.status_check_max_delay,
+            status_max_age=self.status_max_age,
+            status_check_limit=self.status_check_limit,
+            status_check_time_budget=self.status_check_time_budget,
+            dlr_enabled=self.dlr_enabled,
+            dlr_token=self.dlr_token or '',
+            dlr_message_id_path=self._compile_response_path('dlr_message_id_field'),
+            dlr_status_path=self._compile_response_path('dlr_status_field'),
+            dlr_delivered_statuses=frozenset(self._parse_json_setting('dlr_delivered_statuses', '[]') or ()),
+            dlr_failed_statuses=frozenset(self._parse_json_setting('dlr_failed_statuses', '[]') or ()),
+        )
+
+    def _compile_response_path(self, field_name):
+        """Compile a response path field, returning None if it is invalid."""
+        if not self[field_name]:
+            return None
+        try:
+            return compile_path(self[field_name])
+        except ValueError as e:
+            _logger.error("Invalid %s of provider %s: %s", field_name, self.name, str(e))
+            return None
+
+    def _parse_json_setting(self, field_name, default):
+        """Parse a JSON text field, returning None if it is not valid JSON."""
+        try:
+            return json.loads(self[field_name] or default)
+        except json.JSONDecodeError as e:
+            _logger.error("Invalid JSON in %s of provider %s: %s", field_name, self.name, str(e))
+            return None
+
+    @api.model
+    def _drop_config_cache(self, provider_ids):
+        dbname = self.env.cr.dbname
+        with _config_cache_lock:
+            for provider_id in provider_ids:
+                _config_cache.pop((dbname, provider_id), None)
+
+    def action_reset_circuit_breaker(self):
+        """Close the circuit of the providers, e.g. once their outage is known to be over."""
+        self.env['karbura.notification.circuit.breaker'].sudo()._reset(self.ids)
+
+    def action_regenerate_dlr_token(self):
+        """Replace the receipt token, invalidating the current receipt URL."""
+        for provider in self:
+            provider.dlr_token = secrets.token_urlsafe(24)
+
+    def _touch_config(self):
+        """Bump write_date after a change to the provider lines, so that every
+        worker rebuilds its configuration snapshot."""
+        if not self:
+            return
+        self.env.cr.execute("""
+            UPDATE karbura_notification_provider
+               SET write_date = (clock_timestamp() AT TIME ZONE 'UTC')
+             WHERE id IN %s
+        """, [tuple(self.ids)])
+        self.invalidate_recordset(['write_date'])
+        self._drop_config_cache(self.ids)
+
+    @api.model
+    def _get_router(self):
+        """Return the routing table of the active providers.
+
+        The table is rebuilt only when an active provider was added,
+        archived or modified since it was cached, or when the country of the
+        company changed.
+        """
+        providers = self.search([('active', '=', True)])
+        phone_code = str(self.env.company.country_id.phone_code or '')
+        signature = (phone_code,) + tuple((provider.id, provider.write_date) for provider in providers)
+        key = self.env.cr.dbname
+        entry = _router_cache.get(key)
+        if entry and entry[0] == signature:
+            return entry[1]
+        router = providers._build_router(phone_code)
+        with _config_cache_lock:
+            _router_cache[key] = (signature, router)
+        return router
+
+    def _build_router(self, phone_code=''):
+        """Compile the routing table of the providers.
+
+        Args:
+            phone_code: Calling code of the company country, served by the
+                local providers that have no routing rules
+        """
+        ranked = self.sorted(lambda p: (p.cost_per_sms, p.sequence, p.id))
+        trie = PrefixTrie()
+        coverage = {}
+        for provider in ranked:
+            prefixes = provider._get_route_prefixes(phone_code)
+            for prefix in prefixes:
+                # Providers are ranked, the first one to claim a prefix keeps it
+                if trie.get(prefix) is None:
+                    trie.insert(prefix, provider.id)
+            coverage[provider.id] = None if provider.is_international else tuple(prefixes)
+        international = ranked.filtered('is_international')
+        fallback = international[:1] or self[:1]
+        _logger.info("Built SMS routing table with %s prefixes for %s providers", len(trie), len(self))
+        return ProviderRouter(trie=trie, fallback_id=fallback.id or None, coverage=MappingProxyType(coverage))
+
+    def _get_route_prefixes(self, phone_code=''):
+        """Return the number prefixes routed to the provider.
+
+        A local provider without countries or prefixes serves the country of
+        the company, given by ``phone_code``, as it did before routing rules.
+        """
+        self.ensure_one()
+        prefixes = [str(country.phone_code) for country in self.country_ids if country.phone_code]
+        prefixes += [digits_of(prefix) for prefix in (self.route_prefixes or '').split(',')]
+        prefixes = [prefix for prefix in prefixes if prefix]
+        if not prefixes and not self.is_international and phone_code:
+            prefixes = [phone_code]
+        return prefixes
 
     @api.model
     def get_default_provider(self):
@@ -1,81 +1,413 @@
-from odoo import models, api, fields
+from datetime import timedelta
+from odoo import models, api, fields, tools
+import json
 import logging
+import random
+import threading
+import time
+import uuid
+
+from ..tools import metrics
+from ..tools.sms_logging import log_sampled
+from ..tools.sms_segments import analyze_bodies
 
 _logger = logging.getLogger(__name__)
 
+# Number of rows updated by one statement of the set-based writes
+SQL_PAGE_SIZE = 1000
+# Seconds after which stored receipts are applied again by the status check cron
+STORED_RECEIPT_DELAY = 60
+# Order in which the status check cron takes the due messages
+STATUS_CHECK_ORDER = 'next_status_check asc nulls first, id'
+
+
+def _first_status_check_delay(config):
+    """Seconds between sending a message and its first status check.
+
+    With delivery receipts, polling is only a fallback for the messages
+    whose receipt did not come, so it waits for the longest delay.
+    """
+    base_delay = max(config.status_check_delay, 1)
+    if config.dlr_enabled:
+        return max(config.status_check_max_delay, base_delay)
+    return base_delay
+
+
 class SmsSms(models.Model):
     _inherit = 'sms.sms'
 
-    provider_message_id = fields.Char(string='Provider Message ID', readonly=True, 
+    provider_message_id = fields.Char(string='Provider Message ID', readonly=True, index='btree_not_null',
                                     help='Message ID returned by the SMS provider')
+    provider_id = fields.Many2one('karbura.notification.provider', string='Provider', readonly=True,
+                                  ondelete='set null', help='Provider the message was routed to')
     last_status_check = fields.Datetime(string='Last Status Check')
+    next_status_check = fields.Datetime(string='Next Status Check', readonly=True)
+    status_check_count = fields.Integer(string='Status Checks', readonly=True)
+    send_attempts = fields.Integer(string='Send Attempts', readonly=True)
+    idempotency_key = fields.Char(string='Idempotency Key', readonly=True, copy=False,
+                                  help='Key of the send request of the message, kept across its retries '
+                                       'and cleared once the message is sent or fails for good')
+    dead_letter = fields.Boolean(string='Dead Letter', readonly=True, copy=False,
+                                 help='The message failed every send attempt allowed by its provider')
+    sms_encoding = fields.Selection([
+        ('gsm7', 'GSM-7'),
+        ('ucs2', 'UCS-2'),
+    ], string='Encoding', compute='_compute_segments', store=True)
+    segment_count = fields.Integer(string='Segments', compute='_compute_segments', store=True,
+                                   help='Number of SMS segments the body is sent, and billed, as')
+
+    @api.depends('body')
+    def _compute_segments(self):
+        # Records created together mostly share their body, analysed only once
+        for sms, (encoding, segments) in zip(self, analyze_bodies(self.mapped('body'))):
+            sms.sms_encoding = encoding
+            sms.segment_count = segments
+
+    def _auto_init(self):
+        # Create the segment columns before the ORM does, so that it does not
+        # compute them for the whole history of sms_sms on upgrade: only new
+        # messages are analysed, older ones keep no encoding and 0 segments
+        if not tools.column_exists(self.env.cr, self._table, 'segment_count'):
+            tools.create_column(self.env.cr, self._table, 'sms_encoding', 'varchar')
+            tools.create_column(self.env.cr, self._table, 'segment_count', 'int4')
+        return super()._auto_init()
+
+    def init(self):
+        super().init()
+        # Pending messages of the status check cron, in the order it takes them
+        tools.create_index(
+            self.env.cr, 'sms_sms_karbura_pending_status_check_index', self._table,
+            ['next_status_check NULLS FIRST', 'id'],
+            where="state = 'pending' AND provider_message_id IS NOT NULL",
+        )
+
+    @api.model
+    def _process_queue(self, ids=None):
+        """Send the outgoing SMS queue through the outbox.
+
+        Outgoing messages are queued in the outbox, where any number of
+        workers can claim and send them concurrently, then this worker
+        dispatches its share.
+        """
+        domain = [('state', '=', 'outgoing'), ('to_delete', '!=', True)]
+        if ids:
+            domain.append(('id', 'in', ids))
+        outbox = self.env['karbura.notification.outbox'].sudo()
+        outbox._enqueue(self.search(domain, order='id', limit=10000).ids)
+        try:
+            return outbox._dispatch()
+        except Exception:
+            # Never let the cron commit a half-dispatched batch
+            if not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.rollback()
+            _logger.exception("Failed processing SMS queue")
 
     def _send(self, unlink_failed=False, unlink_sent=True, raise_exception=False):
-        """Override the core SMS sending method to use our providers."""
-        _logger.info("=== Starting SMS _send method with %s records ===", len(self))
+        """Override the core SMS sending method to use our providers.
+
+        Every record is routed to a provider (see ``_route_to_providers``),
+        or to the next one by sequence while its circuit is open (see
+        ``_fail_over``), and the records of each provider are sent through
+        it. Records are
+        grouped by body, since a provider request carries a single message,
+        and every group is split in chunks that respect the request size
+        limits of the provider. Chunks are sent concurrently by the SMS API,
+        then the result of each chunk is applied to its own records.
+        """
+        _logger.info("Sending %s SMS", len(self))
+        self.env['karbura.notification.sms.api']._refresh_log_settings()
         
-        # Find the first active provider
-        provider = self.env['karbura.notification.provider'].search([('active', '=', True)], limit=1)
-        if not provider:
+        self._route_to_providers()
+        if not self.provider_id:
             _logger.error("No active SMS provider found")
             return False
-            
-        _logger.info("Using provider: %s, message_id_field: %s", provider.name, provider.message_id_field)
-        
-        # Group recipients
-        recipients = ','.join(record.number for record in self)
+        records = self._fail_over()
+        if not records:
+            return False
         
+        # Mark messages as processing
+        records.write({'state': 'process'})
+
+        success = True
+        try:
+            for provider in records.provider_id:
+                success &= records.filtered(lambda r: r.provider_id == provider)._send_with_provider(
+                    provider, unlink_failed=unlink_failed, raise_exception=raise_exception)
+        finally:
+            self.env['karbura.notification.metric'].sudo()._flush()
+
+        # Only unlink records that are confirmed delivered
+        if unlink_sent:
+            delivered_records = self.exists().filtered(lambda r: r.state == 'sent')
+            _logger.debug("Unlinking %s delivered records", len(delivered_records))
+            delivered_records.unlink()
+
+        return success
+
+    def _route_to_providers(self):
+        """Assign a provider to the records that have no active one yet.
+
+        Numbers are looked up in the routing table of the active providers,
+        and the records of each provider are updated at once.
+        """
+        records = self.filtered(lambda r: not r.provider_id.active)
+        if not records:
+            return
+        router = self.env['karbura.notification.provider']._get_router()
+        ids_by_provider = {}
+        for record in records:
+            ids_by_provider.setdefault(router.route(record.number), []).append(record.id)
+        for provider_id, record_ids in ids_by_provider.items():
+            self.browse(record_ids).write({'provider_id': provider_id or False})
+        _logger.info("Routed %s SMS to %s providers", len(records), len(ids_by_provider))
+
+    def _fail_over(self):
+        """Move the records of providers whose circuit is open to the next eligible provider.
+
+        Each record goes to the next provider by sequence whose circuit is
+        closed and whose routing rules cover its number, international
+        providers covering every number. A provider whose circuit is
+        half-open only gets one request worth of records, as a probe.
+        Records that no provider with a closed circuit can take are queued in
+        the outbox again, for when the first circuit may let a probe through.
+
+        Returns:
+            sms.sms: the records to send now
+        """
+        Breaker = self.env['karbura.notification.circuit.breaker'].sudo()
+        configs = {provider.id: provider._get_config() for provider in self.provider_id}
+        # Only the providers of the records take their probe
+        admission = Breaker._admit(list(configs.values()))
+        if all(state == 'closed' for state in admission.values()):
+            return self
+
+        providers = self.env['karbura.notification.provider'].search([('active', '=', True)])
+        configs.update((provider.id, provider._get_config()) for provider in providers - self.provider_id)
+        admission.update(Breaker._admit([configs[provider.id] for provider in providers - self.provider_id],
+                                        probe=False))
+        available = providers.filtered(lambda p: admission[p.id] == 'closed')
+        router = providers._get_router()
+        deferred_ids = []
+        for provider in self.provider_id:
+            state = admission.get(provider.id, 'closed')
+            if state == 'closed':
+                continue
+            records = self.filtered(lambda r: r.provider_id == provider)
+            if state == 'probe':
+                probe_size = self.env['karbura.notification.sms.api']._get_batch_size(configs[provider.id])
+                records = records[probe_size or len(records):]
+            if not records:
+                continue
+            # Providers are ordered by sequence: try the next ones, wrapping around
+            following = available.filtered(lambda p: (p.sequence, p.id) > (provider.sequence, provider.id))
+            candidates = following | available
+            ids_by_target = {}
+            for record in records:
+                target = next((p for p in candidates if router.serves(p.id, record.number)), None)
+                if target:
+                    ids_by_target.setdefault(target, []).append(record.id)
+                else:
+                    deferred_ids.append(record.id)
+            for target, record_ids in ids_by_target.items():
+                _logger.warning("Circuit of SMS provider %s is open, sending %s SMS through %s",
+                                provider.name, len(record_ids), target.name)
+                self.browse(record_ids).write({'provider_id': target.id})
+
+        deferred = self.browse(deferred_ids)
+        if deferred:
+            open_seconds = min(configs[provider_id].breaker_open_seconds
+                               for provider_id, state in admission.items() if state != 'closed')
+            _logger.warning("No SMS provider with a closed circuit serves %s SMS, postponed by %ss",
+                            len(deferred), open_seconds)
+            deferred.write({'state': 'outgoing'})
+            self.env['karbura.notification.outbox'].sudo()._enqueue(
+                deferred.ids, at=fields.Datetime.now() + timedelta(seconds=max(open_seconds, 1)))
+        return self - deferred
+
+    def _send_with_provider(self, provider, unlink_failed=False, raise_exception=False):
+        """Send the records through the given provider."""
+        _logger.info("Sending %s SMS through %s", len(self), provider.name)
+        config = provider._get_config()
+        start = time.monotonic()
+
+        self._count_send_attempt()
+        chunks = self._split_for_provider(config)
+        results = self.env['karbura.notification.sms.api']._dispatch_sms(
+            provider, [(','.join(chunk.mapped('number')), chunk[0].body, chunk._get_request_key())
+                       for chunk in chunks])
+
+        success = True
+        errors = []
+        for chunk, result in zip(chunks, results):
+            chunk._record_send_result(config, result)
+            try:
+                success &= chunk._apply_send_result(provider, result, unlink_failed=unlink_failed,
+                                                    raise_exception=raise_exception)
+            except Exception as e:
+                # The other chunks were sent too: apply their results before raising
+                success = False
+                errors.append(e)
+        # Transient failures and slow answers are what the circuit breaker watches
+        failures = sum(1 for result in results if (
+            not result.get('success') and result.get('retryable')
+            or (config.breaker_slow_latency and result.get('duration', 0) > config.breaker_slow_latency)))
+        self.env['karbura.notification.circuit.breaker'].sudo()._record(config, len(results), failures)
+        if config.dlr_enabled:
+            # Receipts may have come before the message IDs were written
+            self._apply_stored_receipts(provider)
+        metrics.observe('karbura_sms_send_duration_seconds', {'provider': config.name}, time.monotonic() - start)
+
+        # Wake the status check cron up when the first checks become due
+        try:
+            self.env.ref('karbura_notification.ir_cron_sms_delivery_status_check').sudo()._trigger(
+                at=fields.Datetime.now() + timedelta(seconds=_first_status_check_delay(config)))
+            _logger.debug("Scheduled SMS delivery status check")
+        except ValueError as e:
+            _logger.warning("Could not schedule SMS delivery status check: %s", str(e))
+
+        if errors:
+            raise errors[0]
+        return success
+
+    def _record_send_result(self, config, result):
+        """Count the messages of a chunk accepted and refused by the provider."""
+        if result.get('success'):
+            failed_recipients = set(result.get('failed_recipients') or ())
+            failed = sum(1 for record in self if record.number in failed_recipients)
+            failure_type = 'sms_server'
+        else:
+            failed = len(self)
+            failure_type = result.get('failure_type') or 'sms_server'
+        if len(self) > failed:
+            metrics.inc('karbura_sms_messages_total', {'provider': config.name, 'result': 'accepted'},
+                        len(self) - failed)
+        if failed:
+            metrics.inc('karbura_sms_messages_total', {'provider': config.name, 'result': 'failed'}, failed)
+            metrics.inc('karbura_sms_failures_total', {'provider': config.name, 'failure_type': failure_type},
+                        failed)
+
+    def _count_send_attempt(self):
+        """Count one more send attempt for every record, in a single statement."""
+        self.flush_recordset(['send_attempts'])
+        self.env.cr.execute("""
+            UPDATE sms_sms SET send_attempts = COALESCE(send_attempts, 0) + 1
+             WHERE id IN %s
+        """, [tuple(self.ids)])
+        self.invalidate_recordset(['send_attempts'])
+
+    def _split_for_provider(self, config):
+        """Split the records in chunks that can each be sent in one request.
+
+        Records already sent in a failed request keep their chunk and its
+        idempotency key, so that a retry is the very same request (see
+        ``_get_request_key`` for chunks split since). The others
+        are first partitioned by body, then each partition is cut so that a
+        chunk holds at most ``max_recipients_per_request`` numbers, or the
+        current adaptive batch size, its estimated payload stays under
+        ``max_payload_bytes`` and its segments, counted once per recipient,
+        stay within ``max_segments_per_request``. Every new chunk gets its
+        own key.
+
+        Returns:
+            list: sms.sms recordsets, one per provider request
+        """
+        retried = {}
+        for record in self.filtered('idempotency_key'):
+            retried.setdefault((record.idempotency_key, record.body or ''), []).append(record.id)
+        new_chunks = (self - self.browse([record_id for ids in retried.values() for record_id in ids])
+                      )._split_by_size(config)
+        for chunk in new_chunks:
+            chunk.idempotency_key = uuid.uuid4().hex
+        chunks = [self.browse(record_ids) for record_ids in retried.values()] + new_chunks
+        if retried:
+            _logger.info("Retrying %s SMS requests with their idempotency keys", len(retried))
+        return chunks
+
+    def _get_request_key(self):
+        """Return the idempotency key of the send request of a chunk.
+
+        The key is derived from the stored key of the chunk and from its
+        records. A retry of the whole chunk repeats the key of the failed
+        request, while a part of it, split off by another outbox claim or a
+        probe, is a new request with a key of its own, so that a provider
+        never replays the response of the whole chunk for a part of it.
+        """
+        return uuid.uuid5(uuid.UUID(self[0].idempotency_key), ','.join(map(str, sorted(self.ids)))).hex
+
+    def _split_by_size(self, config):
+        """Cut the records in chunks of one body within the request size limits."""
+        if not self:
+            return []
+        partitions = {}
+        for record in self:
+            partitions.setdefault(record.body or '', []).append(record.id)
+
+        max_recipients = self.env['karbura.notification.sms.api']._get_batch_size(config) or len(self) or 1
+        max_bytes = config.max_payload_bytes
+        overhead = config.payload_renderer.static_size if config.payload_renderer else 0
+
+        chunks = []
+        for body, record_ids in partitions.items():
+            base_size = overhead + len(json.dumps(body).encode())
+            records = self.browse(record_ids)
+            body_recipients = max_recipients
+            if config.max_segments_per_request:
+                # Every recipient of the partition gets the same segments
+                body_recipients = max(min(max_recipients,
+                                          config.max_segments_per_request // max(records[0].segment_count, 1)), 1)
+            chunk_ids = []
+            size = base_size
+            for record in records:
+                number_size = len((record.number or '').encode()) + 1
+                if chunk_ids and (len(chunk_ids) >= body_recipients
+                                  or (max_bytes and size + number_size > max_bytes)):
+                    chunks.append(self.browse(chunk_ids))
+                    chunk_ids = []
+                    size = base_size
+                chunk_ids.append(record.id)
+                size += number_size
+            if chunk_ids:
+                chunks.append(self.browse(chunk_ids))
+
+        _logger.info("Split %s SMS records into %s bodies and %s requests",
+                     len(self), len(partitions), len(chunks))
+        return chunks
+
+    def _apply_send_result(self, provider, result, unlink_failed=False, raise_exception=False):
+        """Apply the result of the send request of one chunk to its records."""
         try:
-            # Mark messages as processing
-            self.write({'state': 'process'})
-            
-            # Send SMS to all recipients
-            result = self.env['karbura.notification.sms.api'].send_sms(
-                provider=provider, 
-                recipients=recipients, 
-                message=self[0].body  # Assumes all records have the same body
-            )
-            
             # Process results
             if result.get('success'):
                 response_json = result.get('response_data', {})
-                _logger.info("=== Processing provider response ===")
-                _logger.info("Provider: %s", provider.name)
-                _logger.info("Message ID field: %s", provider.message_id_field)
-                _logger.info("Response data: %s", response_json)
-                
                 # Get the message IDs using the configured field/path
-                message_ids = self._get_value_by_path(response_json, provider.message_id_field)
-                _logger.info("=== Message ID extraction result ===")
-                _logger.info("Found message IDs: %s", message_ids)
+                message_ids = self.env['karbura.notification.sms.api']._get_value_by_path(
+                    response_json, provider._get_config().message_id_path)
+                _logger.debug("Found %s message IDs for %s records", len(message_ids), len(self))
                 
                 if message_ids:
-                    _logger.info("=== Storing message IDs ===")
-                    _logger.info("Message IDs to store: %s", message_ids)
-                    
+                    first_check = fields.Datetime.now() + timedelta(
+                        seconds=_first_status_check_delay(provider._get_config()))
                     # Map message IDs to records if we have multiple
                     if len(message_ids) == len(self):
-                        _logger.info("Number of message IDs matches number of records, mapping one-to-one")
-                        for record, msg_id in zip(self, message_ids):
-                            record.write({
-                                'state': 'pending',
-                                'provider_message_id': msg_id,
-                                'failure_type': False
-                            })
-                            _logger.info("Stored message ID %s for record %s", msg_id, record.id)
+                        _logger.debug("Number of message IDs matches number of records, mapping one-to-one")
+                        self._write_provider_message_ids(message_ids, first_check)
                     else:
-                        _logger.info("Using first message ID for all records")
+                        _logger.debug("Using first message ID for all records")
                         self.write({
                             'state': 'pending',
                             'provider_message_id': message_ids[0],
-                            'failure_type': False
+                            'failure_type': False,
+                            'status_check_count': 0,
+                            'next_status_check': first_check,
+                            'idempotency_key': False,
                         })
-                        _logger.info("Stored message ID %s for records: %s", message_ids[0], self.ids)
+                        _logger.debug("Stored message ID %s for %s records", message_ids[0], len(self))
                 else:
                     _logger.warning("No message IDs found in provider response using field %s", provider.message_id_field)
+                    self.write({'idempotency_key': False})
                 
                 # Mark failed recipients
-                failed_recipients = result.get('failed_recipients', [])
+                failed_recipients = set(result.get('failed_recipients', []))
                 failed_records = self.filtered(lambda r: r.number in failed_recipients)
                 if failed_records:
                     failed_records.write({
@@ -85,27 +417,23 @@ class SmsSms(models.Model):
                     if unlink_failed:
                         failed_records.unlink()
                 
-                # Only unlink records that are confirmed delivered
-                if unlink_sent:
-                    delivered_records = self.filtered(lambda r: r.state == 'sent')
-                    _logger.debug("Unlinking %s delivered records", len(delivered_records))
-                    delivered_records.unlink()
-                
-                # Trigger status check cron immediately
-                try:
-                    self.env.ref('karbura_notification.ir_cron_sms_delivery_status_check').sudo().method_direct_trigger()
-                    _logger.info("Triggered SMS delivery status check")
-                except ValueError as e:
-                    _logger.warning("Could not trigger SMS delivery status check: %s", str(e))
-                
+            elif result.get('retryable') and self._schedule_send_retry(provider._get_config(),
+                                                                       result.get('retry_after')):
+                _logger.warning("Failed to send SMS batch, retry scheduled: %s", result.get('failure_reason'))
+                return False
             else:
-                # Entire batch failed
+                # Entire chunk failed
                 _logger.error("Failed to send SMS batch: %s", result.get('failure_reason'))
                 self.write({
                     'state': 'error',
-                    'failure_type': result.get('failure_type', 'sms_server')
+                    'failure_type': result.get('failure_type', 'sms_server'),
+                    # Out of attempts for a transient failure
+                    'dead_letter': bool(result.get('retryable')),
+                    'idempotency_key': False,
                 })
-                
+                if result.get('retryable'):
+                    metrics.inc('karbura_sms_dead_letters_total', {'provider': provider.name}, len(self))
+
                 if unlink_failed:
                     self.unlink()
                 
@@ -116,9 +444,10 @@ class SmsSms(models.Model):
         
         except Exception as e:
             _logger.exception("Error sending SMS batch: %s", str(e))
-            self.write({
+            self.exists().write({
                 'state': 'error',
-                'failure_type': 'sms_server'
+                'failure_type': 'sms_server',
+                'idempotency_key': False,
             })
             
             if raise_exception:
@@ -126,142 +455,372 @@ class SmsSms(models.Model):
             
             return False
 
-    def _get_value_by_path(self, data, path):
-        """Get a value from nested dictionaries/lists using a dot-separated path.
-        Returns a list of values found at the path."""
-        _logger.info("=== Extracting message IDs ===")
-        _logger.info("Looking for path: %s in data: %s", path, data)
-        
-        def search_recursively(d, target_key):
-            """Search for key recursively in nested dictionaries and lists.
-            Returns a list of all matching values."""
-            _logger.info("Searching recursively in: %s for key: %s", d, target_key)
-            results = []
-            
-            if isinstance(d, dict):
-                for key, value in d.items():
-                    _logger.info("Checking dict key: %s", key)
-                    if key == target_key:
-                        _logger.info("Found direct match! Key: %s, Value: %s", key, value)
-                        results.append(value)
-                    
-                    # Recurse into nested structures
-                    if isinstance(value, (dict, list)):
-                        _logger.info("Recursing into nested structure: %s", value)
-                        nested_results = search_recursively(value, target_key)
-                        if nested_results:
-                            results.extend(nested_results)
-                            
-            elif isinstance(d, list):
-                _logger.info("Searching in list of length: %s", len(d))
-                for item in d:
-                    if isinstance(item, (dict, list)):
-                        _logger.info("Recursing into list item: %s", item)
-                        nested_results = search_recursively(item, target_key)
-                        if nested_results:
-                            results.extend(nested_results)
-            
-            return results
-        
-        try:
-            # If no dots in path, search recursively through all nested structures
-            if '.' not in path:
-                _logger.info("No dots in path, searching recursively for key: %s", path)
-                results = search_recursively(data, path)
-                if results:
-                    _logger.info("Found values recursively: %s", results)
-                    return [str(r) if r is not None else None for r in results]
-                _logger.info("Key %s not found in any level", path)
-                return []
-            
-            # Handle dot notation path
-            _logger.info("Path contains dots, traversing: %s", path)
-            current = data
-            parts = path.split('.')
-            results = []
-            
-            # Special handling for the last part to collect all values
-            *path_parts, last_part = parts
-            
-            # Navigate to the parent level
-            for part in path_parts:
-                _logger.info("Processing part: %s, current data: %s", part, current)
-                # Handle array indexing
-                if '[' in part and ']' in part:
-                    array_part = part.split('[')[0]
-                    index = int(part.split('[')[1].split(']')[0])
-                    _logger.info("Array access - key: %s, index: %s", array_part, index)
-                    current = current[array_part][index]
-                else:
-                    _logger.info("Dict access - key: %s", part)
-                    current = current[part]
-                _logger.info("After access - value: %s", current)
-            
-            # At the final level, collect all matching values
-            if isinstance(current, list):
-                for item in current:
-                    if isinstance(item, dict) and last_part in item:
-                        value = item[last_part]
-                        _logger.info("Found value in list item: %s", value)
-                        results.append(value)
-            elif isinstance(current, dict) and last_part in current:
-                value = current[last_part]
-                _logger.info("Found value in dict: %s", value)
-                if isinstance(value, list):
-                    results.extend(value)
-                else:
-                    results.append(value)
-            
-            _logger.info("Found values at path: %s", results)
-            return [str(r) if r is not None else None for r in results]
-                
-        except (KeyError, IndexError, TypeError, ValueError) as e:
-            _logger.warning("Failed to get value using path %s: %s", path, str(e))
-            return []
+    def _schedule_send_retry(self, config, retry_after=None):
+        """Put the records back in the outbox for another attempt, after a backoff.
+
+        The delay doubles with every attempt up to ``retry_max_delay`` and
+        never undercuts the pause asked by the provider. Half of it is random,
+        so that chunks failing together do not all come back together.
+
+        Returns:
+            bool: False, scheduling nothing, once the records are out of attempts
+        """
+        attempts = max(self.mapped('send_attempts') or [0])
+        if attempts >= config.retry_max_attempts:
+            return False
+        delay = min(max(config.retry_base_delay, 1) * 2 ** min(max(attempts - 1, 0), 30),
+                    max(config.retry_max_delay, 1))
+        delay = max(delay / 2 + random.uniform(0, delay / 2), retry_after or 0)
+        self.write({'state': 'outgoing', 'failure_type': False})
+        self.env['karbura.notification.outbox'].sudo()._enqueue(
+            self.ids, at=fields.Datetime.now() + timedelta(seconds=delay))
+        metrics.inc('karbura_sms_retries_total', {'provider': config.name}, len(self))
+        return True
+
+    def _write_provider_message_ids(self, message_ids, next_status_check):
+        """Mark the records as pending with their own provider message ID.
+
+        The IDs are written with one ``UPDATE ... FROM (VALUES ...)`` per
+        page of records instead of one ORM write per record.
+
+        Args:
+            message_ids: Provider message IDs, in the order of the records
+            next_status_check: Date of the first status check
+        """
+        fnames = ['provider_message_id', 'state', 'failure_type', 'status_check_count', 'next_status_check',
+                  'idempotency_key']
+        self.flush_recordset(fnames)
+        rows = list(zip(self.ids, message_ids))
+        for start in range(0, len(rows), SQL_PAGE_SIZE):
+            page = rows[start:start + SQL_PAGE_SIZE]
+            self.env.cr.execute("""
+                UPDATE sms_sms AS sms
+                   SET provider_message_id = v.message_id,
+                       state = 'pending',
+                       failure_type = NULL,
+                       status_check_count = 0,
+                       next_status_check = %%s,
+                       idempotency_key = NULL,
+                       write_uid = %%s,
+                       write_date = (now() AT TIME ZONE 'UTC')
+                  FROM (VALUES %s) AS v(id, message_id)
+                 WHERE sms.id = v.id
+            """ % ', '.join(['(%s, %s)'] * len(page)),
+                [next_status_check, self.env.uid] + [value for row in page for value in row])
+        self.invalidate_recordset(fnames + ['write_uid', 'write_date'])
+
+    def _schedule_status_check(self, config):
+        """Plan the next status check of the records with exponential backoff.
+
+        The n-th check of a message happens ``status_check_delay * 2 ** n``
+        seconds after the previous one, capped at ``status_check_max_delay``.
+        Every record is rescheduled by the same UPDATE statement.
+
+        Args:
+            config: SMS provider configuration snapshot
+        """
+        if not self:
+            return
+        base_delay = max(config.status_check_delay, 1)
+        self.flush_recordset(['status_check_count', 'next_status_check'])
+        # Past 2 ** 30 the delay is always capped, don't compute huge numbers
+        self.env.cr.execute("""
+            UPDATE sms_sms
+               SET status_check_count = COALESCE(status_check_count, 0) + 1,
+                   next_status_check = (now() AT TIME ZONE 'UTC') + make_interval(secs =>
+                       LEAST(%s * power(2, LEAST(COALESCE(status_check_count, 0) + 1, 30)), %s)),
+                   write_uid = %s,
+                   write_date = (now() AT TIME ZONE 'UTC')
+             WHERE id IN %s
+        """, [base_delay, max(config.status_check_max_delay, base_delay), self.env.uid, tuple(self.ids)])
+        self.invalidate_recordset(['status_check_count', 'next_status_check', 'write_uid', 'write_date'])
+
+    def _apply_status_results(self, delivered, failed, failure_type='sms_server'):
+        """Record a status check of the records and apply the final states found.
+
+        Each target state is applied to all of its records at once, so the
+        SMS, their trackers and the related mailing traces are updated by a
+        single write per state rather than one per record.
+
+        Args:
+            delivered: Records confirmed as delivered
+            failed: Records that will never be delivered
+            failure_type: Failure type of the failed records
+        """
+        self.write({'last_status_check': fields.Datetime.now()})
+        if delivered:
+            _logger.info("%s SMS marked as delivered", len(delivered))
+            delivered._update_sms_state_and_trackers('sent', failure_type=False)
+        if failed:
+            _logger.info("%s SMS marked as failed", len(failed))
+            failed._update_sms_state_and_trackers('error', failure_type=failure_type)
 
     @api.model
     def _check_sms_status(self):
-        """Check delivery status for pending SMS messages."""
-        _logger.info("=== Starting SMS Status Check Cron ===")
-        
-        # Find SMS records that are pending and have a provider message ID
-        pending_sms = self.search([
-            ('state', '=', 'pending'),  # Only check messages that are sent but not confirmed delivered
-            ('provider_message_id', '!=', False)
-        ])
-        
-        _logger.info("Found %s pending SMS messages to check", len(pending_sms))
-        
-        # Find active provider
-        provider = self.env['karbura.notification.provider'].search([('active', '=', True)], limit=1)
-        if not provider:
+        """Check delivery status for pending SMS messages.
+
+        The messages of every active provider are checked through the
+        provider that sent them; messages sent before routing was recorded
+        are checked through the first active provider. The whole run stops
+        starting new batches once the largest ``status_check_time_budget``
+        of the active providers has elapsed.
+        """
+        _logger.info("Starting SMS status check")
+        self.env['karbura.notification.sms.api']._refresh_log_settings()
+
+        providers = self.env['karbura.notification.provider'].search([('active', '=', True)])
+        if not providers:
             _logger.error("No active SMS provider configured")
             return
-            
-        for record in pending_sms:
+
+        deadline = time.monotonic() + max(max(provider._get_config().status_check_time_budget, 1)
+                                          for provider in providers)
+        self.env['karbura.notification.delivery.receipt'].sudo()._purge()
+        try:
+            for provider in providers:
+                if provider._get_config().dlr_enabled:
+                    self._apply_stored_receipts(provider)
+                self._check_provider_sms_status(
+                    provider, self._get_provider_status_domain(provider, unrouted=provider == providers[0]),
+                    deadline=deadline)
+        finally:
+            self.env['karbura.notification.metric'].sudo()._flush()
+
+        _logger.info("Completed SMS status check")
+
+    @api.model
+    def _check_provider_sms_status(self, provider, provider_domain, deadline=None):
+        """Check delivery status for the pending SMS messages of a provider.
+
+        Messages are checked by batches, most overdue first, following the
+        schedule set by ``_schedule_status_check``. A run stops after
+        ``status_check_limit`` messages, once ``status_check_time_budget``
+        seconds have elapsed or at the ``deadline`` of the whole cron run,
+        a ``time.monotonic()`` value, and each batch is committed as soon as
+        it is done. Messages pending for more than ``status_max_age`` hours are
+        first marked as expired, by pages, instead of being checked again;
+        they count against the same limit and time budget. Expiry needs no
+        request, so it also runs when the status URL is unreachable.
+        """
+        config = provider._get_config()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        start = time.monotonic()
+        now = fields.Datetime.now()
+        pending_domain = self._get_pending_status_domain(provider_domain)
+
+        limit = max(config.status_check_limit, 1)
+        batch_size = max(config.status_batch_size, 1) if config.status_mode == 'batch' else 100
+        budget_deadline = start + max(config.status_check_time_budget, 1)
+        deadline = min(deadline, budget_deadline) if deadline is not None else budget_deadline
+
+        # Expired messages count against the same limit and time budget,
+        # e.g. the backlog of old pending messages on the first run
+        expired = 0
+        if config.status_max_age > 0:
+            expired_domain = pending_domain + [
+                ('create_date', '<', now - timedelta(hours=config.status_max_age)),
+            ]
+            while expired < limit and time.monotonic() < deadline:
+                expired_sms = self.search(expired_domain, order='id', limit=min(SQL_PAGE_SIZE, limit - expired))
+                if not expired_sms:
+                    break
+                expired_sms._update_sms_state_and_trackers('error', failure_type='sms_expired')
+                metrics.inc('karbura_sms_failures_total', {'provider': config.name, 'failure_type': 'sms_expired'},
+                            len(expired_sms))
+                expired += len(expired_sms)
+                if auto_commit:
+                    self.env.cr.commit()
+            if expired:
+                _logger.info("%s pending SMS of %s expired without delivery report", expired, provider.name)
+
+        # Skip the checks at once rather than failing every record
+        if not self.env['karbura.notification.sms.api']._check_provider_reachable(config.status_url):
+            _logger.warning("Provider %s is unreachable, postponing status checks", provider.name)
+            return
+
+        due_domain = self._get_due_status_domain(provider_domain, now)
+        checked = 0
+        while expired + checked < limit and time.monotonic() < deadline:
+            pending_sms = self.search(due_domain, order=STATUS_CHECK_ORDER,
+                                      limit=min(batch_size, limit - expired - checked))
+            if not pending_sms:
+                break
+            if config.status_mode == 'batch':
+                pending_sms._check_sms_status_batch(provider)
+            else:
+                pending_sms._check_sms_status_single(provider)
+            # Rescheduling every checked record also moves failed checks out of this run
+            pending_sms.exists().filtered(lambda r: r.state == 'pending')._schedule_status_check(config)
+            checked += len(pending_sms)
+            if auto_commit:
+                self.env.cr.commit()
+
+        _logger.info("Checked the status of %s pending SMS messages of %s", checked, provider.name)
+        metrics.inc('karbura_sms_status_checks_total', {'provider': config.name}, checked)
+        metrics.observe('karbura_sms_status_check_run_seconds', {'provider': config.name}, time.monotonic() - start)
+
+    @api.model
+    def _get_provider_status_domain(self, provider, unrouted=False):
+        """Domain of the messages of a provider, and of the messages sent
+        before routing was recorded if ``unrouted``."""
+        provider_domain = [('provider_id', '=', provider.id)]
+        if unrouted:
+            provider_domain = ['|', ('provider_id', '=', False)] + provider_domain
+        return provider_domain
+
+    @api.model
+    def _get_pending_status_domain(self, provider_domain):
+        """Domain of the messages sent but not confirmed delivered yet."""
+        return provider_domain + [
+            ('state', '=', 'pending'),
+            ('provider_message_id', '!=', False),
+        ]
+
+    @api.model
+    def _get_due_status_domain(self, provider_domain, now):
+        """Domain of the pending messages whose status check is due, as read
+        from the partial index created by ``init``."""
+        return self._get_pending_status_domain(provider_domain) + [
+            '|', ('next_status_check', '=', False), ('next_status_check', '<=', now),
+        ]
+
+    def _check_sms_status_single(self, provider):
+        """Check the status of the records with one status request each."""
+        delivered_ids = []
+        failed_ids = []
+        for record in self:
             try:
-                _logger.info("Checking status for SMS ID: %s, Provider Message ID: %s", 
-                           record.id, record.provider_message_id)
+                log_sampled(_logger, logging.DEBUG, "Checking status for SMS ID: %s, Provider Message ID: %s",
+                            record.id, record.provider_message_id)
                 
                 result = self.env['karbura.notification.sms.api'].check_sms_status(
                     provider=provider,
                     message_id=record.provider_message_id
                 )
                 
-                record.last_status_check = fields.Datetime.now()
-                
                 if result.get('success'):
                     if result.get('delivered'):
-                        _logger.info("SMS ID %s marked as delivered", record.id)
-                        record._update_sms_state_and_trackers('sent', failure_type=False)
+                        delivered_ids.append(record.id)
                     elif result.get('failure_reason'):
-                        _logger.warning("SMS ID %s failed: %s", record.id, result.get('failure_reason'))
-                        record._update_sms_state_and_trackers('error', failure_type='sms_server')
+                        log_sampled(_logger, logging.WARNING, "SMS ID %s failed: %s",
+                                    record.id, result.get('failure_reason'))
+                        failed_ids.append(record.id)
                 else:
-                    _logger.error("Status check failed for SMS ID %s: %s", 
+                    log_sampled(_logger, logging.ERROR, "Status check failed for SMS ID %s: %s",
                                 record.id, result.get('failure_reason'))
                         
             except Exception as e:
                 _logger.exception("Error checking SMS status for ID %s: %s", record.id, str(e))
-                
-        _logger.info("=== Completed SMS Status Check Cron ===")
+
+        self._apply_status_results(self.browse(delivered_ids), self.browse(failed_ids))
+
+    @api.model
+    def _apply_delivery_receipts(self, provider, data):
+        """Apply the delivery receipts pushed by a provider.
+
+        The pending messages of every receipt are fetched with one query and
+        each final state is applied to all of its messages at once. Receipts
+        whose message is not pending are stored, as the transaction sending
+        the message may not be committed yet (see ``_apply_stored_receipts``).
+
+        Args:
+            provider: SMS provider configuration
+            data: Decoded receipt payload
+
+        Returns:
+            dict: Number of messages marked as 'delivered' and 'failed', and
+            number of receipts stored for later
+        """
+        self.env['karbura.notification.sms.api']._refresh_log_settings()
+        receipts = self.env['karbura.notification.sms.api'].parse_delivery_receipts(provider, data)
+        if not receipts:
+            return {'delivered': 0, 'failed': 0, 'stored': 0}
+
+        delivered_sms, failed_sms = self._apply_receipt_states(provider, receipts)
+        matched = set((delivered_sms | failed_sms).mapped('provider_message_id'))
+        unmatched = {message_id: state for message_id, state in receipts.items() if message_id not in matched}
+        if unmatched:
+            self.env['karbura.notification.delivery.receipt'].sudo()._store(provider, unmatched)
+            # Apply them soon rather than at the fallback status check
+            self.env.ref('karbura_notification.ir_cron_sms_delivery_status_check').sudo()._trigger(
+                at=fields.Datetime.now() + timedelta(seconds=STORED_RECEIPT_DELAY))
+            metrics.inc('karbura_sms_delivery_receipts_total', {'provider': provider.name, 'state': 'stored'},
+                        len(unmatched))
+        self.env['karbura.notification.metric'].sudo()._flush()
+        _logger.info("Delivery receipts of %s: %s SMS delivered, %s SMS failed, %s receipts stored",
+                     provider.name, len(delivered_sms), len(failed_sms), len(unmatched))
+        return {'delivered': len(delivered_sms), 'failed': len(failed_sms), 'stored': len(unmatched)}
+
+    @api.model
+    def _apply_stored_receipts(self, provider):
+        """Apply the stored receipts of a provider whose message is now pending."""
+        receipts = self.env['karbura.notification.delivery.receipt'].sudo()._take_matching(provider)
+        if receipts:
+            delivered_sms, failed_sms = self._apply_receipt_states(provider, receipts)
+            _logger.info("Stored delivery receipts of %s: %s SMS delivered, %s SMS failed",
+                         provider.name, len(delivered_sms), len(failed_sms))
+
+    @api.model
+    def _apply_receipt_states(self, provider, receipts):
+        """Apply final states to the pending messages of a provider.
+
+        Args:
+            provider: SMS provider configuration
+            receipts: Final state by provider message ID
+
+        Returns:
+            tuple: the messages marked as delivered and as failed
+        """
+        pending_sms = self.search(self._get_receipt_domain(provider, list(receipts)))
+        delivered_sms = pending_sms.filtered(lambda r: receipts[r.provider_message_id] == 'delivered')
+        failed_sms = pending_sms - delivered_sms
+        pending_sms._apply_status_results(delivered_sms, failed_sms, failure_type='sms_not_delivered')
+        metrics.inc('karbura_sms_delivery_receipts_total', {'provider': provider.name, 'state': 'delivered'},
+                    len(delivered_sms))
+        metrics.inc('karbura_sms_delivery_receipts_total', {'provider': provider.name, 'state': 'failed'},
+                    len(failed_sms))
+        if failed_sms:
+            metrics.inc('karbura_sms_failures_total',
+                        {'provider': provider.name, 'failure_type': 'sms_not_delivered'}, len(failed_sms))
+        return delivered_sms, failed_sms
+
+    @api.model
+    def _get_receipt_domain(self, provider, message_ids):
+        """Domain of the pending messages of a provider with the given message IDs."""
+        return [
+            ('state', '=', 'pending'),
+            ('provider_id', 'in', [provider.id, False]),
+            ('provider_message_id', 'in', message_ids),
+        ]
+
+    def _check_sms_status_batch(self, provider):
+        """Check the status of the records with batch status requests."""
+        batch_size = max(provider._get_config().status_batch_size, 1)
+        records_by_message_id = {}
+        for record in self:
+            records_by_message_id.setdefault(record.provider_message_id, []).append(record.id)
+        message_ids = list(records_by_message_id)
+
+        for start in range(0, len(message_ids), batch_size):
+            batch_ids = message_ids[start:start + batch_size]
+            batch_records = self.browse([
+                record_id for message_id in batch_ids for record_id in records_by_message_id[message_id]
+            ])
+            try:
+                result = self.env['karbura.notification.sms.api'].check_sms_status_batch(
+                    provider=provider,
+                    message_ids=batch_ids
+                )
+                if not result.get('success'):
+                    batch_records.write({'last_status_check': fields.Datetime.now()})
+                    _logger.error("Batch status check failed for %s SMS", len(batch_records))
+                    continue
+
+                delivered_ids = [
+                    record_id
+                    for message_id, status in result['statuses'].items() if status['delivered']
+                    for record_id in records_by_message_id[message_id]
+                ]
+                batch_records._apply_status_results(self.browse(delivered_ids), self.browse())
+            except Exception as e:
+                _logger.exception("Error checking SMS status for %s SMS: %s", len(batch_records), str(e))
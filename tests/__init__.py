@@ -0,0 +1,10 @@
+from . import test_mailing_sms_render
+from . import test_sms_status_query_plan
+from . import test_sms_template_params
+from . import test_payload_template
+from . import test_phone_numbers
+from . import test_json_path
+from . import test_prefix_trie
+from . import test_adaptive
+from . import test_metrics
+from . import test_sms_segments
@@ -0,0 +1,78 @@
+import time
+from email.utils import formatdate
+
+from odoo.tests.common import BaseCase
+
+from ..tools.adaptive import AimdController, parse_retry_after
+
+
+class TestAimdController(BaseCase):
+
+    def controller(self, **kwargs):
+        values = dict(min_batch=10, max_batch=100, min_concurrency=1, max_concurrency=8,
+                      target_latency=1.0, batch=50, concurrency=4)
+        values.update(kwargs)
+        return AimdController(**values)
+
+    def test_additive_increase(self):
+        controller = self.controller()
+        self.assertFalse(controller.record(0.1, True))
+        self.assertAlmostEqual(controller.batch, 50 + 0.05 * 100 / 4)
+        self.assertAlmostEqual(controller.concurrency, 4.25)
+
+    def test_increase_stops_at_the_ceiling(self):
+        controller = self.controller(batch=100, concurrency=8)
+        for _i in range(10):
+            controller.record(0.1, True)
+        self.assertEqual((controller.batch_size, controller.max_in_flight), (100, 8))
+
+    def test_multiplicative_decrease(self):
+        for latency, success in ((0.1, False), (2.0, True)):
+            controller = self.controller()
+            self.assertTrue(controller.record(latency, success))
+            self.assertEqual((controller.batch_size, controller.max_in_flight), (25, 2))
+
+    def test_decrease_stops_at_the_floor(self):
+        controller = self.controller(batch=12, concurrency=1)
+        controller.record(0.1, False)
+        self.assertEqual((controller.batch_size, controller.max_in_flight), (10, 1))
+
+    def test_one_decrease_per_latency(self):
+        controller = self.controller()
+        self.assertTrue(controller.record(2.0, False))
+        # Failures of the requests sent together count as one signal
+        self.assertFalse(controller.record(2.0, False))
+        self.assertEqual((controller.batch_size, controller.max_in_flight), (25, 2))
+
+    def test_slot_timeout(self):
+        controller = self.controller(concurrency=1)
+        self.assertTrue(controller.acquire(timeout=0.01))
+        start = time.monotonic()
+        self.assertFalse(controller.acquire(timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        # The slot is taken even on timeout and must be released
+        self.assertEqual(controller.in_flight, 2)
+        controller.release()
+        controller.release()
+        self.assertEqual(controller.in_flight, 0)
+        self.assertTrue(controller.acquire(timeout=0.01))
+
+    def test_throttled_pause(self):
+        controller = self.controller()
+        self.assertTrue(controller.record(0.1, False, throttled=True, retry_after=30))
+        self.assertFalse(controller.acquire(timeout=0.01))
+        controller.release()
+
+
+class TestParseRetryAfter(BaseCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after(' 120 '), 120.0)
+
+    def test_http_date(self):
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 60, usegmt=True)), 60, delta=2)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_invalid(self):
+        for value in (None, '', 'soon', '-5'):
+            self.assertIsNone(parse_retry_after(value), value)
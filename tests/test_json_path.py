@@ -0,0 +1,48 @@
+from odoo.tests.common import BaseCase
+
+from ..tools.json_path import compile_path
+
+
+class TestJsonPath(BaseCase):
+
+    RESPONSE = {
+        'status': 'ok',
+        'data': {
+            'messages': [
+                {'id': 'm1', 'status': 'sent'},
+                {'id': 'm2', 'status': 'queued'},
+            ],
+        },
+    }
+
+    def test_bare_key_searches_every_level(self):
+        self.assertEqual(compile_path('status').find(self.RESPONSE), ['ok', 'sent', 'queued'])
+
+    def test_keys_fan_out_over_lists(self):
+        self.assertEqual(compile_path('data.messages.id').find(self.RESPONSE), ['m1', 'm2'])
+
+    def test_index(self):
+        self.assertEqual(compile_path('data.messages[0].id').find(self.RESPONSE), ['m1'])
+        self.assertEqual(compile_path('data.messages[-1].id').find(self.RESPONSE), ['m2'])
+        self.assertEqual(compile_path('data.messages[5].id').find(self.RESPONSE), [])
+
+    def test_wildcard(self):
+        self.assertEqual(compile_path('data.messages[*].status').find(self.RESPONSE), ['sent', 'queued'])
+        self.assertEqual(compile_path('data.*').find(self.RESPONSE), self.RESPONSE['data']['messages'])
+
+    def test_recursive_descent(self):
+        self.assertEqual(compile_path('data..status').find(self.RESPONSE), ['sent', 'queued'])
+
+    def test_missing_keys(self):
+        self.assertEqual(compile_path('data.missing.id').find(self.RESPONSE), [])
+        self.assertEqual(compile_path('missing').find(self.RESPONSE), [])
+        self.assertEqual(compile_path('status.id').find(self.RESPONSE), [])
+        self.assertEqual(compile_path('data.messages.id').find([]), [])
+
+    def test_find_strings(self):
+        self.assertEqual(compile_path('code').find_strings({'code': 0, 'items': [{'code': None}]}), ['0', None])
+
+    def test_invalid(self):
+        for expression in ('', 'data.', 'data..', '.data', 'data[0', 'data[*]*'):
+            with self.assertRaises(ValueError, msg=expression):
+                compile_path(expression)
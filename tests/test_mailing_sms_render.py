@@ -0,0 +1,39 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestMailingSmsRender(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partners = cls.env['res.partner'].create([
+            {'name': 'Alice', 'mobile': '+237699000001', 'ref': 'A-001'},
+            {'name': 'Bob', 'mobile': '+237699000002'},
+        ])
+        cls.mailing = cls.env['mailing.mailing'].create({
+            'name': 'SMS render test',
+            'subject': 'SMS render test',
+            'mailing_type': 'sms',
+            'mailing_model_id': cls.env['ir.model']._get('res.partner').id,
+            'body_plaintext': 'Hello',
+        })
+
+    def test_static_body(self):
+        self.assertFalse(self.mailing._is_sms_body_dynamic())
+        bodies = self.mailing._render_sms_bodies(self.partners.ids)
+        self.assertEqual(bodies, dict.fromkeys(self.partners.ids, 'Hello'))
+
+    def test_placeholder_body(self):
+        self.mailing.body_plaintext = 'Hello {{ object.name }}'
+        self.assertTrue(self.mailing._is_sms_body_dynamic())
+        bodies = self.mailing._render_sms_bodies(self.partners.ids)
+        self.assertEqual(bodies, {partner.id: 'Hello %s' % partner.name for partner in self.partners})
+
+    def test_placeholder_with_default(self):
+        self.mailing.body_plaintext = 'Hello {{ object.ref ||| friend }}'
+        self.assertTrue(self.mailing._is_sms_body_dynamic())
+        alice, bob = self.partners
+        bodies = self.mailing._render_sms_bodies(self.partners.ids)
+        self.assertEqual(bodies[alice.id], 'Hello A-001')
+        self.assertEqual(bodies[bob.id], 'Hello friend')
@@ -0,0 +1,63 @@
+from odoo.tests.common import BaseCase
+
+from ..tools import metrics
+
+
+class TestMetrics(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        # Keep the increments recorded by other code out of the test
+        metrics.drain()
+        self.addCleanup(metrics.drain)
+
+    def test_label_escaping(self):
+        self.assertEqual(metrics.format_labels({'b': 'x', 'a': 1}), 'a="1",b="x"')
+        self.assertEqual(metrics.format_labels({'error': 'a\\b "c"\nd'}), r'error="a\\b \"c\"\nd"')
+        self.assertEqual(metrics.format_labels({}), '')
+
+    def test_counter(self):
+        metrics.inc('karbura_sms_messages_total', {'provider': 'p1', 'result': 'sent'}, 3)
+        metrics.inc('karbura_sms_messages_total', {'result': 'sent', 'provider': 'p1'})
+        self.assertEqual(metrics.drain(), {
+            ('karbura_sms_messages_total', 'provider="p1",result="sent"'): 4.0,
+        })
+        self.assertEqual(metrics.drain(), {})
+
+    def test_histogram(self):
+        metrics.observe('karbura_sms_request_duration_seconds', {'provider': 'p1'}, 0.3)
+        values = metrics.drain()
+        name = 'karbura_sms_request_duration_seconds'
+        self.assertEqual(values[(name + '_bucket', 'provider="p1",le="0.25"')], 0.0)
+        self.assertEqual(values[(name + '_bucket', 'provider="p1",le="0.5"')], 1.0)
+        self.assertEqual(values[(name + '_bucket', 'provider="p1",le="+Inf"')], 1.0)
+        self.assertEqual(values[(name + '_sum', 'provider="p1"')], 0.3)
+        self.assertEqual(values[(name + '_count', 'provider="p1"')], 1.0)
+        self.assertEqual(len(values), len(metrics.LATENCY_BUCKETS) + 3)
+
+    def test_render(self):
+        name = 'karbura_sms_request_duration_seconds'
+        text = metrics.render([
+            ('karbura_sms_queue_depth', 'state="outgoing"', 7),
+            (name + '_bucket', 'le="+Inf"', 2),
+            (name + '_bucket', 'le="10.0"', 2),
+            (name + '_bucket', 'le="0.5"', 1),
+            (name + '_sum', '', 1.5),
+            (name + '_count', '', 2),
+            ('karbura_sms_unknown', 'error="a \\"b\\""', 1),
+        ])
+        self.assertEqual(text, '\n'.join([
+            '# HELP karbura_sms_queue_depth SMS waiting to be sent or to be confirmed, by state',
+            '# TYPE karbura_sms_queue_depth gauge',
+            'karbura_sms_queue_depth{state="outgoing"} 7.0',
+            '# HELP %s Latency of the requests sent to SMS providers' % name,
+            '# TYPE %s histogram' % name,
+            '%s_bucket{le="0.5"} 1.0' % name,
+            '%s_bucket{le="10.0"} 2.0' % name,
+            '%s_bucket{le="+Inf"} 2.0' % name,
+            '%s_count 2.0' % name,
+            '%s_sum 1.5' % name,
+            '# HELP karbura_sms_unknown ',
+            '# TYPE karbura_sms_unknown untyped',
+            'karbura_sms_unknown{error="a \\"b\\""} 1.0',
+        ]) + '\n')
@@ -0,0 +1,29 @@
+import json
+
+from odoo.tests.common import BaseCase
+
+from ..tools.payload_template import compile_template
+
+
+class TestPayloadTemplate(BaseCase):
+
+    def test_extra_field_names(self):
+        template = compile_template({'key': '{api-key}', 'from': '{sender.id}', 'to': '{recipient}'})
+        params = {'api-key': 'K', 'sender.id': 'KARBURA', 'recipient': '+237699000001'}
+        expected = {'key': 'K', 'from': 'KARBURA', 'to': '+237699000001'}
+        self.assertEqual(json.loads(template.render_bytes(params)), expected)
+        self.assertEqual(template.render(params), expected)
+
+    def test_unknown_placeholder_untouched(self):
+        template = compile_template({'key': '{api-key}', 'note': 'see {unknown}'})
+        self.assertEqual(json.loads(template.render_bytes({})), {'key': '{api-key}', 'note': 'see {unknown}'})
+
+    def test_list_values(self):
+        template = compile_template({'ids': '{messageids}', 'text': 'ids: {messageids}'})
+        payload = json.loads(template.render_bytes({'messageids': ['a', 'b']}))
+        self.assertEqual(payload, {'ids': ['a', 'b'], 'text': 'ids: a,b'})
+
+    def test_escaping(self):
+        template = compile_template({'body': '{message}'})
+        message = 'He said "hi"\nsee you'
+        self.assertEqual(json.loads(template.render_bytes({'message': message}))['body'], message)
@@ -0,0 +1,35 @@
+from odoo.tests.common import BaseCase
+
+from ..tools.phone_numbers import normalize_numbers
+
+
+class TestPhoneNumbers(BaseCase):
+
+    def assertNormalized(self, numbers, phone_code, expected):
+        self.assertEqual(normalize_numbers(numbers, phone_code), expected)
+
+    def test_international(self):
+        self.assertNormalized(['+237 699 00 00 00', '+33 6 12 34 56 78'], '237',
+                              ['+237699000000', '+33612345678'])
+        self.assertNormalized(['00237699000000', '0033612345678'], '237', ['+237699000000', '+33612345678'])
+
+    def test_trunk_prefix(self):
+        self.assertNormalized(['0699000000', '06-99-00-00-00'], '237', ['+237699000000', '+237699000000'])
+
+    def test_already_prefixed(self):
+        self.assertNormalized(['237699000000'], '237', ['+237699000000'])
+
+    def test_national_without_trunk_prefix(self):
+        self.assertNormalized(['699000000'], '237', ['+237699000000'])
+        self.assertNormalized(['4155550123'], 1, ['+14155550123'])
+
+    def test_other_country_without_plus(self):
+        # Not rewritten into +23733612345678
+        self.assertNormalized(['33612345678'], '237', [None])
+
+    def test_invalid(self):
+        self.assertNormalized(['n/a', '', '12', '+0123456789'], '237', [None, None, None, None])
+
+    def test_no_default_country(self):
+        self.assertNormalized(['699000000', ' 0699 000 000 ', '+33612345678', '00237699000000'], False,
+                              ['699000000', '0699 000 000', '+33612345678', '+237699000000'])
@@ -0,0 +1,43 @@
+from odoo.tests.common import BaseCase
+
+from ..tools.prefix_trie import PrefixTrie, digits_of
+
+
+class TestPrefixTrie(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trie = PrefixTrie()
+        self.trie.insert('237', 'cameroon')
+        self.trie.insert('2376', 'cameroon mobile')
+        self.trie.insert('23769', 'cameroon mtn')
+        self.trie.insert('33', 'france')
+
+    def test_digits_of(self):
+        for number in ('+237 6 99', '00237699', '237699', '(237) 699'):
+            self.assertEqual(digits_of(number), '237699')
+        self.assertEqual(digits_of(False), '')
+
+    def test_longest_prefix(self):
+        self.assertEqual(self.trie.longest_match('+237 699 00 00 00'), 'cameroon mtn')
+        self.assertEqual(self.trie.longest_match('+237 677 00 00 00'), 'cameroon mobile')
+        self.assertEqual(self.trie.longest_match('+237 222 00 00 00'), 'cameroon')
+        self.assertEqual(self.trie.longest_match('0033612345678'), 'france')
+
+    def test_no_match(self):
+        self.assertIsNone(self.trie.longest_match('+44 20 7946 0000'))
+        self.assertEqual(self.trie.longest_match('+44 20 7946 0000', 'fallback'), 'fallback')
+        self.assertEqual(self.trie.longest_match('23'), None)
+
+    def test_empty_prefix_matches_everything(self):
+        self.trie.insert('', 'default')
+        self.assertEqual(self.trie.longest_match('+44 20 7946 0000'), 'default')
+        self.assertEqual(self.trie.longest_match('+237 699 00 00 00'), 'cameroon mtn')
+
+    def test_insert_and_get(self):
+        self.assertEqual(len(self.trie), 4)
+        self.trie.insert('+237', 'cameroon again')
+        self.assertEqual(len(self.trie), 4)
+        self.assertEqual(self.trie.get('237'), 'cameroon again')
+        self.assertIsNone(self.trie.get('2'))
+        self.assertIsNone(self.trie.get('2377'))
@@ -0,0 +1,45 @@
+from odoo.tests.common import BaseCase
+
+from ..tools.sms_segments import analyze_bodies, analyze_body, segments_of
+
+
+class TestSmsSegments(BaseCase):
+
+    def test_gsm7_boundaries(self):
+        self.assertEqual(analyze_body('a' * 160), ('gsm7', 1))
+        self.assertEqual(analyze_body('a' * 161), ('gsm7', 2))
+        self.assertEqual(analyze_body('a' * 306), ('gsm7', 2))
+        self.assertEqual(analyze_body('a' * 307), ('gsm7', 3))
+
+    def test_ucs2_boundaries(self):
+        self.assertEqual(analyze_body('я' * 70), ('ucs2', 1))
+        self.assertEqual(analyze_body('я' * 71), ('ucs2', 2))
+        self.assertEqual(analyze_body('я' * 134), ('ucs2', 2))
+        self.assertEqual(analyze_body('я' * 135), ('ucs2', 3))
+
+    def test_one_character_makes_the_body_ucs2(self):
+        self.assertEqual(analyze_body('a' * 69 + '✓'), ('ucs2', 1))
+        self.assertEqual(analyze_body('a' * 70 + '✓'), ('ucs2', 2))
+
+    def test_surrogate_pairs_count_double(self):
+        self.assertEqual(analyze_body('😀' * 35), ('ucs2', 1))
+        self.assertEqual(analyze_body('😀' * 36), ('ucs2', 2))
+
+    def test_extension_characters_count_double(self):
+        self.assertEqual(analyze_body('€' * 80), ('gsm7', 1))
+        self.assertEqual(analyze_body('€' * 81), ('gsm7', 2))
+        self.assertEqual(analyze_body('a' * 159 + '['), ('gsm7', 2))
+        self.assertEqual(analyze_body('a' * 157 + '{}'), ('gsm7', 2))
+        self.assertEqual(analyze_body('a' * 156 + '{}'), ('gsm7', 1))
+
+    def test_empty_body(self):
+        self.assertEqual(analyze_body(''), ('gsm7', 1))
+        self.assertEqual(analyze_body(False), ('gsm7', 1))
+
+    def test_segments_of(self):
+        self.assertEqual(segments_of('gsm7', 153 * 4), 4)
+        self.assertEqual(segments_of('ucs2', 67 * 4 + 1), 5)
+
+    def test_analyze_bodies_keeps_order(self):
+        self.assertEqual(analyze_bodies(['Hello', 'Prix: 10€ ✓', 'Hello']),
+                         [('gsm7', 1), ('ucs2', 1), ('gsm7', 1)])
@@ -0,0 +1,58 @@
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL
+
+from ..models.sms_sms import STATUS_CHECK_ORDER
+
+ROWS = 20000
+PENDING_EVERY = 100
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+@tagged('post_install', '-at_install')
+class TestSmsStatusQueryPlan(TransactionCase):
+    """The status check cron and the delivery receipt lookup must be served
+    by the indexes of the module, not by a scan of the whole SMS history."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.provider = cls.env['karbura.notification.provider'].create({
+            'name': 'Query plan provider',
+            'base_url': 'https://sms.example.com/send',
+        })
+        # Mostly historical messages, as on a production database
+        cls.env.cr.execute("""
+            INSERT INTO sms_sms (number, state, provider_id, provider_message_id, next_status_check)
+            SELECT '+2376' || lpad(n::text, 8, '0'),
+                   CASE WHEN n %% %(every)s = 0 THEN 'pending' ELSE 'sent' END,
+                   %(provider)s,
+                   'msg-' || n,
+                   (now() AT TIME ZONE 'UTC') + (n %% 7200 - 3600) * interval '1 second'
+              FROM generate_series(1, %(rows)s) AS n
+        """, {'rows': ROWS, 'every': PENDING_EVERY, 'provider': cls.provider.id})
+        cls.env.cr.execute("ANALYZE sms_sms")
+
+    def assertIndexScan(self, query, index):
+        self.env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", query.select()))
+        nodes = list(plan_nodes(self.env.cr.fetchone()[0][0]['Plan']))
+        self.assertIn(index, {node.get('Index Name') for node in nodes})
+        self.assertFalse([node for node in nodes if node['Node Type'] == 'Seq Scan'])
+
+    def test_status_check_plan(self):
+        Sms = self.env['sms.sms'].sudo()
+        for unrouted in (False, True):
+            domain = Sms._get_due_status_domain(
+                Sms._get_provider_status_domain(self.provider, unrouted=unrouted), fields.Datetime.now())
+            query = Sms._search(domain, order=STATUS_CHECK_ORDER, limit=100)
+            self.assertIndexScan(query, 'sms_sms_karbura_pending_status_check_index')
+
+    def test_delivery_receipt_plan(self):
+        Sms = self.env['sms.sms'].sudo()
+        query = Sms._search(Sms._get_receipt_domain(self.provider, ['msg-5000', 'msg-17000', 'msg-1234567']))
+        self.assertIndexScan(query, 'sms_sms__provider_message_id_index')
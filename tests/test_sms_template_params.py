@@ -0,0 +1,38 @@
+import json
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSmsTemplateParams(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.SmsApi = cls.env['karbura.notification.sms.api']
+        cls.provider = cls.env['karbura.notification.provider'].create({
+            'name': 'Template params provider',
+            'base_url': 'https://sms.example.com/send',
+            'payload_template': '{"to": "{recipient}", "body": "{message}", '
+                                '"user": "{username}", "pass": "{password}"}',
+        })
+
+    def render(self):
+        config = self.provider._get_config()
+        return json.loads(self.SmsApi._render_request_body(
+            config, config.payload_renderer, {'to': '+237699000001', 'body': 'Hello'}))
+
+    def test_provider_credentials(self):
+        self.provider.write({'username': 'user', 'password': 'secret'})
+        payload = self.render()
+        self.assertEqual((payload['user'], payload['pass']), ('user', 'secret'))
+        self.assertEqual((payload['to'], payload['body']), ('+237699000001', 'Hello'))
+
+    def test_extra_field_credentials(self):
+        self.provider.write({'username': False, 'password': False})
+        self.env['karbura.notification.extra.field'].create([
+            {'provider_id': self.provider.id, 'name': 'username', 'value': 'extra-user'},
+            {'provider_id': self.provider.id, 'name': 'password', 'value': 'extra-secret'},
+        ])
+        payload = self.render()
+        self.assertEqual((payload['user'], payload['pass']), ('extra-user', 'extra-secret'))
@@ -0,0 +1,8 @@
+from . import json_path
+from . import prefix_trie
+from . import phone_numbers
+from . import sms_logging
+from . import metrics
+from . import adaptive
+from . import payload_template
+from . import sms_segments
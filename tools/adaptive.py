@@ -0,0 +1,129 @@
+"""Adaptive sizing of the send requests of a provider.
+
+:class:`AimdController` tunes the recipients per request and the requests
+in flight of one provider from the outcome of each request, with an
+additive increase / multiplicative decrease scheme: every request answered
+in time grows both values a little, while an error, a request slower than
+the target latency or an HTTP 429 halves them. Decreases happen at most
+once per observed request latency, so a burst of failures of requests sent
+together counts as one congestion signal. A ``Retry-After`` pause holds
+back new requests until it is over.
+"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Share of the ceiling added to the batch size by a window of successful requests
+BATCH_INCREASE = 0.05
+# Factor applied to the operating point on congestion
+DECREASE_FACTOR = 0.5
+# Weight of the last request in the latency average
+LATENCY_WEIGHT = 0.2
+# Longest Retry-After pause honoured, in seconds
+MAX_PAUSE = 60.0
+
+
+def parse_retry_after(value):
+    """Return the pause requested by a ``Retry-After`` header, in seconds.
+
+    Both the delay-seconds and the HTTP-date forms are accepted; anything
+    else gives None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class AimdController:
+    """Operating point of the send requests of one provider in one worker."""
+
+    def __init__(self, min_batch, max_batch, min_concurrency, max_concurrency, target_latency,
+                 batch=None, concurrency=None):
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.latency = 0.0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self.batch = float(batch or max_batch)
+        self.concurrency = float(concurrency or max_concurrency)
+        self.configure(min_batch, max_batch, min_concurrency, max_concurrency, target_latency)
+
+    def configure(self, min_batch, max_batch, min_concurrency, max_concurrency, target_latency):
+        """Set the bounds of the operating point, keeping it within them."""
+        with self._cond:
+            self.min_batch = max(min_batch, 1)
+            self.max_batch = max(max_batch, self.min_batch)
+            self.min_concurrency = max(min_concurrency, 1)
+            self.max_concurrency = max(max_concurrency, self.min_concurrency)
+            self.target_latency = target_latency
+            self.batch = min(max(self.batch, self.min_batch), self.max_batch)
+            self.concurrency = min(max(self.concurrency, self.min_concurrency), self.max_concurrency)
+            self._cond.notify_all()
+
+    @property
+    def batch_size(self):
+        return int(self.batch)
+
+    @property
+    def max_in_flight(self):
+        return int(self.concurrency)
+
+    def acquire(self, timeout=None):
+        """Wait for a request slot, honouring the pause requested by the provider.
+
+        Every call must be followed by a :meth:`release`, since the slot is
+        taken even when the wait times out.
+
+        Returns:
+            bool: False if no slot was freed within ``timeout`` seconds
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now >= self.paused_until and self.in_flight < self.max_in_flight:
+                    self.in_flight += 1
+                    return True
+                wait = self.paused_until - now if now < self.paused_until else None
+                if deadline is not None:
+                    if now >= deadline:
+                        self.in_flight += 1
+                        return False
+                    wait = min(wait, deadline - now) if wait is not None else deadline - now
+                self._cond.wait(wait)
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            self._cond.notify()
+
+    def record(self, latency, success, throttled=False, retry_after=None):
+        """Adjust the operating point after a request.
+
+        Returns:
+            bool: whether the operating point was decreased
+        """
+        with self._cond:
+            self.latency = latency if not self.latency else (
+                LATENCY_WEIGHT * latency + (1 - LATENCY_WEIGHT) * self.latency)
+            now = time.monotonic()
+            if throttled:
+                self.paused_until = max(self.paused_until, now + min(retry_after or 1.0, MAX_PAUSE))
+            if throttled or not success or (self.target_latency and latency > self.target_latency):
+                if now - self._last_decrease < self.latency:
+                    return False
+                self._last_decrease = now
+                self.batch = max(self.batch * DECREASE_FACTOR, self.min_batch)
+                self.concurrency = max(self.concurrency * DECREASE_FACTOR, self.min_concurrency)
+                return True
+            # One full window of successful requests adds one request and a share of the batch ceiling
+            self.batch = min(self.batch + BATCH_INCREASE * self.max_batch / self.concurrency, self.max_batch)
+            self.concurrency = min(self.concurrency + 1 / self.concurrency, self.max_concurrency)
+            self._cond.notify_all()
+            return False
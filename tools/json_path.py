@@ -0,0 +1,149 @@
+"""Compiled path expressions used to read values out of provider responses.
+
+Supported syntax::
+
+    status              any ``status`` key at any depth (same as ``..status``)
+    data.message_id     key lookups, fanning out over lists on the way
+    messages[0].id      list index
+    messages[*].id      every list item (``*`` also matches every dict value)
+    data..status        recursive descent below ``data``
+
+Expressions are parsed once by :func:`compile_path`; the resulting
+:class:`JsonPath` only walks the document.
+"""
+import re
+from functools import lru_cache
+
+_TOKEN_RE = re.compile(r"""
+      (?P<descend>\.\.)
+    | (?P<dot>\.)
+    | \[\s*(?P<index>-?\d+)\s*\]
+    | \[\s*\*\s*\]
+    | (?P<wildcard>\*)
+    | (?P<key>[^.\[\]*]+)
+""", re.VERBOSE)
+
+_KEY, _INDEX, _WILDCARD, _DESCEND = range(4)
+
+
+class JsonPath:
+    """A compiled path expression."""
+
+    __slots__ = ('expression', 'steps')
+
+    def __init__(self, expression, steps):
+        self.expression = expression
+        self.steps = steps
+
+    def __repr__(self):
+        return 'JsonPath(%r)' % self.expression
+
+    def find(self, data):
+        """Return the list of values matched by the path in ``data``.
+
+        Matched values that are lists are flattened into the result.
+        """
+        nodes = [data]
+        for kind, arg in self.steps:
+            if not nodes:
+                return []
+            matched = []
+            if kind == _KEY:
+                for node in nodes:
+                    if isinstance(node, dict):
+                        if arg in node:
+                            matched.append(node[arg])
+                    elif isinstance(node, list):
+                        for item in node:
+                            if isinstance(item, dict) and arg in item:
+                                matched.append(item[arg])
+            elif kind == _INDEX:
+                for node in nodes:
+                    if isinstance(node, list):
+                        try:
+                            matched.append(node[arg])
+                        except IndexError:
+                            pass
+            elif kind == _WILDCARD:
+                for node in nodes:
+                    if isinstance(node, dict):
+                        matched.extend(node.values())
+                    elif isinstance(node, list):
+                        matched.extend(node)
+            else:
+                for node in nodes:
+                    _descend(node, arg, matched)
+            nodes = matched
+        result = []
+        for node in nodes:
+            if isinstance(node, list):
+                result.extend(node)
+            else:
+                result.append(node)
+        return result
+
+    def find_strings(self, data):
+        """Like :meth:`find`, with every non-null value converted to ``str``."""
+        return [str(value) if value is not None else None for value in self.find(data)]
+
+
+def _descend(node, key, matched):
+    if isinstance(node, dict):
+        for name, value in node.items():
+            if name == key:
+                matched.append(value)
+            if isinstance(value, (dict, list)):
+                _descend(value, key, matched)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, (dict, list)):
+                _descend(item, key, matched)
+
+
+@lru_cache(maxsize=256)
+def compile_path(expression):
+    """Compile a path expression, raising ``ValueError`` if it is invalid."""
+    expression = (expression or '').strip()
+    if not expression:
+        raise ValueError("Empty path expression")
+    if not any(c in expression for c in '.[*'):
+        # A bare key is searched at every level of the response
+        return JsonPath(expression, ((_DESCEND, expression),))
+
+    steps = []
+    pos = 0
+    descend = False
+    expect_key = True
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match:
+            raise ValueError("Invalid path expression %r at position %s" % (expression, pos))
+        pos = match.end()
+        if match.group('descend'):
+            if descend:
+                raise ValueError("Invalid path expression %r at position %s" % (expression, match.start()))
+            descend = expect_key = True
+        elif match.group('dot'):
+            if expect_key:
+                raise ValueError("Invalid path expression %r at position %s" % (expression, match.start()))
+            expect_key = True
+        elif match.group('key') is not None:
+            if not expect_key:
+                raise ValueError("Invalid path expression %r at position %s" % (expression, match.start()))
+            key = match.group('key').strip()
+            steps.append((_DESCEND, key) if descend else (_KEY, key))
+            descend = expect_key = False
+        elif match.group('wildcard'):
+            if descend or not expect_key:
+                raise ValueError("Invalid path expression %r at position %s" % (expression, match.start()))
+            steps.append((_WILDCARD, None))
+            expect_key = False
+        else:
+            if descend:
+                raise ValueError("Invalid path expression %r at position %s" % (expression, match.start()))
+            index = match.group('index')
+            steps.append((_INDEX, int(index)) if index is not None else (_WILDCARD, None))
+            expect_key = False
+    if expect_key:
+        raise ValueError("Invalid path expression %r: it cannot end with a separator" % expression)
+    return JsonPath(expression, tuple(steps))
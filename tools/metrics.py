@@ -0,0 +1,122 @@
+"""In-process metrics of the SMS module, exported in Prometheus text format.
+
+Counters and histograms are accumulated in memory by every thread of a
+worker, without touching the database. :func:`drain` hands the increments
+collected since the previous drain to the caller, which adds them to the
+shared table of the database, so the exported values cover every worker.
+Histograms are stored as their ``_bucket``, ``_sum`` and ``_count``
+counters, as in the Prometheus exposition format.
+"""
+import threading
+
+# name: (type, help)
+METRICS = {
+    'karbura_sms_requests_total': (
+        'counter', 'Requests sent to SMS providers, by operation and outcome'),
+    'karbura_sms_request_duration_seconds': (
+        'histogram', 'Latency of the requests sent to SMS providers'),
+    'karbura_sms_messages_total': (
+        'counter', 'SMS handed to providers, by result of the send request'),
+    'karbura_sms_failures_total': (
+        'counter', 'SMS that failed, by failure type'),
+    'karbura_sms_retries_total': (
+        'counter', 'SMS put back in the outbox after a transient send failure'),
+    'karbura_sms_dead_letters_total': (
+        'counter', 'SMS left in error after failing every send attempt'),
+    'karbura_sms_send_duration_seconds': (
+        'histogram', 'Duration of the sending of a batch of SMS through a provider'),
+    'karbura_sms_status_checks_total': (
+        'counter', 'Pending SMS whose delivery status was checked'),
+    'karbura_sms_status_check_run_seconds': (
+        'histogram', 'Duration of a run of the status check cron for a provider'),
+    'karbura_sms_delivery_receipts_total': (
+        'counter', 'SMS updated by a delivery receipt, by final state'),
+    'karbura_sms_queue_depth': (
+        'gauge', 'SMS waiting to be sent or to be confirmed, by state'),
+    'karbura_sms_status_poll_lag_seconds': (
+        'gauge', 'Delay of the most overdue status check'),
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_values = {}
+_lock = threading.Lock()
+
+
+def format_labels(labels):
+    """Return the canonical Prometheus label string of a label dict."""
+    return ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in sorted(labels.items())
+    )
+
+
+def inc(name, labels, value=1.0):
+    """Add ``value`` to a counter."""
+    key = (name, format_labels(labels))
+    with _lock:
+        _values[key] = _values.get(key, 0.0) + value
+
+
+def observe(name, labels, value):
+    """Record one observation in a histogram."""
+    label_str = format_labels(labels)
+    with _lock:
+        # Every bucket is recorded, even empty, so that all of them are exported
+        for bound in LATENCY_BUCKETS:
+            key = (name + '_bucket', _join(label_str, 'le="%s"' % bound))
+            _values[key] = _values.get(key, 0.0) + (1 if value <= bound else 0)
+        for key, amount in (((name + '_bucket', _join(label_str, 'le="+Inf"')), 1),
+                            ((name + '_sum', label_str), value),
+                            ((name + '_count', label_str), 1)):
+            _values[key] = _values.get(key, 0.0) + amount
+
+
+def _join(labels, extra):
+    return '%s,%s' % (labels, extra) if labels else extra
+
+
+def drain():
+    """Return the increments recorded since the last call and reset them.
+
+    Returns:
+        dict: (sample name, label string) to increment
+    """
+    global _values
+    with _lock:
+        values, _values = _values, {}
+    return values
+
+
+def render(samples):
+    """Render samples in the Prometheus text exposition format.
+
+    Args:
+        samples: Iterable of (sample name, label string, value)
+    """
+    by_metric = {}
+    for name, labels, value in samples:
+        metric = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                metric = name[:-len(suffix)]
+        by_metric.setdefault(metric, []).append((name, labels, value))
+
+    lines = []
+    for metric in sorted(by_metric):
+        kind, help_text = METRICS.get(metric, ('untyped', ''))
+        lines.append('# HELP %s %s' % (metric, help_text))
+        lines.append('# TYPE %s %s' % (metric, kind))
+        for name, labels, value in sorted(by_metric[metric], key=_sample_order):
+            lines.append('%s{%s} %s' % (name, labels, repr(float(value))) if labels
+                         else '%s %s' % (name, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+def _sample_order(sample):
+    name, labels, _value = sample
+    # Keep histogram buckets in increasing order of their bound
+    if 'le="' in labels:
+        bound = labels.rsplit('le="', 1)[1].rstrip('"')
+        return (name, labels.rsplit('le="', 1)[0], float('inf') if bound == '+Inf' else float(bound))
+    return (name, labels, 0.0)
@@ -0,0 +1,135 @@
+"""Precompiled JSON request templates of the providers.
+
+A template is a JSON document whose strings may hold ``{name}``
+placeholders. :func:`compile_template` walks it once and keeps every
+constant part as pre-encoded JSON text, so that rendering a request only
+encodes the strings that hold placeholders, each with the JSON escaping of
+its own value. A string made of a single placeholder whose value is a list
+becomes a JSON array (e.g. ``"{messageids}"``); inside a longer string a
+list is joined with commas. A placeholder name is anything between braces,
+such as ``{api-key}``; placeholders without a value are left as they are.
+"""
+import json
+import re
+
+# Any name between braces, as Extra Field names may hold '-' or '.'
+_PLACEHOLDER_RE = re.compile(r'\{([^{}]+)\}')
+_MISSING = object()
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _text(params, name):
+    value = params.get(name, _MISSING)
+    if value is _MISSING:
+        return '{%s}' % name
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    return str(value)
+
+
+def _substitute(pieces, params, as_key=False):
+    """Fill a string split around its placeholders (literals at even positions)."""
+    if not as_key and len(pieces) == 3 and not pieces[0] and not pieces[2]:
+        value = params.get(pieces[1])
+        if isinstance(value, (list, tuple)):
+            return list(value)
+    return ''.join(piece if i % 2 == 0 else _text(params, piece) for i, piece in enumerate(pieces))
+
+
+class PayloadTemplate:
+    """A compiled request template."""
+
+    __slots__ = ('template', 'static_size', '_parts', '_close')
+
+    def __init__(self, template, parts, close):
+        self.template = template
+        self._parts = parts
+        self._close = close
+        self.static_size = sum(len(part.encode()) for part in parts + [close] if isinstance(part, str))
+
+    def __repr__(self):
+        return 'PayloadTemplate(%r)' % (self.template,)
+
+    def render(self, params):
+        """Return the template filled with ``params`` as a JSON-compatible value."""
+        return self._render_node(self.template, params)
+
+    def _render_node(self, node, params):
+        if isinstance(node, dict):
+            return {
+                _substitute(_PLACEHOLDER_RE.split(key), params, as_key=True): self._render_node(value, params)
+                for key, value in node.items()
+            }
+        if isinstance(node, list):
+            return [self._render_node(value, params) for value in node]
+        if isinstance(node, str):
+            return _substitute(_PLACEHOLDER_RE.split(node), params)
+        return node
+
+    def render_bytes(self, params, extra=None):
+        """Return the UTF-8 encoded JSON request body filled with ``params``.
+
+        Args:
+            params: Placeholder values
+            extra: Fields added to the top-level object, if the template is one
+        """
+        out = [part if isinstance(part, str) else _encode(_substitute(part[1], params, as_key=part[0]))
+               for part in self._parts]
+        if extra and self._close == '}':
+            separator = ',' if isinstance(self.template, dict) and self.template else ''
+            out.append(separator + ','.join('%s:%s' % (_encode(key), _encode(value)) for key, value in extra.items()))
+        out.append(self._close)
+        return ''.join(out).encode()
+
+
+def _compile_string(value, parts, as_key=False):
+    pieces = _PLACEHOLDER_RE.split(value)
+    if len(pieces) == 1:
+        parts.append(_encode(value))
+    else:
+        parts.append((as_key, tuple(pieces)))
+
+
+def _compile_node(node, parts):
+    if isinstance(node, dict):
+        parts.append('{')
+        for i, (key, value) in enumerate(node.items()):
+            if i:
+                parts.append(',')
+            _compile_string(str(key), parts, as_key=True)
+            parts.append(':')
+            _compile_node(value, parts)
+        parts.append('}')
+    elif isinstance(node, list):
+        parts.append('[')
+        for i, value in enumerate(node):
+            if i:
+                parts.append(',')
+            _compile_node(value, parts)
+        parts.append(']')
+    elif isinstance(node, str):
+        _compile_string(node, parts)
+    else:
+        parts.append(_encode(node))
+
+
+def compile_template(template):
+    """Compile a parsed JSON template.
+
+    Returns:
+        PayloadTemplate: the compiled template
+    """
+    parts = []
+    _compile_node(template, parts)
+    # The last part is kept apart so that extra fields can go before it
+    close = parts.pop() if parts and parts[-1] in ('}', ']') else ''
+    merged = []
+    for part in parts:
+        if isinstance(part, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return PayloadTemplate(template, merged, close)
@@ -0,0 +1,96 @@
+"""Normalisation of recipient phone numbers to E.164.
+
+Numbers are normalised in bulk by :func:`normalize_numbers`. Each distinct
+raw string is parsed once per worker and the result is cached, as the same
+contacts come back in every campaign::
+
+    normalize_numbers(['+237 699 00 00 00', '0699000000', 'n/a'], '237')
+    # ['+237699000000', '+237699000000', None]
+"""
+import re
+from functools import lru_cache
+
+# Formatting characters found in contact phone numbers
+_SEPARATORS_RE = re.compile(r'[\s\-./() ]')
+
+# E.164 numbers have at most 15 digits; shorter than 8 is never a mobile
+MIN_DIGITS = 8
+MAX_DIGITS = 15
+# Longer digit strings without a trunk prefix may be international numbers
+MAX_NATIONAL_DIGITS = 10
+
+# ITU-T E.164 country calling codes
+CALLING_CODES = frozenset(
+    ['1', '7']
+    + '20 27 30 31 32 33 34 36 39 40 41 43 44 45 46 47 48 49 51 52 53 54 55 56 57 58 '
+      '60 61 62 63 64 65 66 81 82 84 86 90 91 92 93 94 95 98'.split()
+    + '211 212 213 216 218 290 291 297 298 299 420 421 423 670 800 808 850 852 853 855 856 '
+      '870 878 880 881 882 883 886 888 979 998'.split()
+    + [str(code) for code in range(220, 259)]
+    + [str(code) for code in range(260, 270)]
+    + [str(code) for code in range(350, 360)]
+    + [str(code) for code in range(370, 390) if code not in (384, 388)]
+    + [str(code) for code in range(500, 510)]
+    + [str(code) for code in range(590, 600)]
+    + [str(code) for code in range(672, 693) if code != 684]
+    + [str(code) for code in range(960, 969)]
+    + [str(code) for code in range(970, 978)]
+    + [str(code) for code in range(992, 997)]
+)
+
+
+def calling_code_of(digits):
+    """Return the country calling code that prefixes international digits, if any."""
+    for length in (1, 2, 3):
+        if digits[:length] in CALLING_CODES:
+            return digits[:length]
+    return None
+
+
+@lru_cache(maxsize=65536)
+def normalize_number(number, default_phone_code):
+    """Return the E.164 form of a phone number, or None if it is invalid.
+
+    Numbers starting with ``+`` or ``00`` are international. Other numbers
+    are national numbers of the default country: their trunk prefix ``0``
+    is dropped and the country calling code is added, unless they already
+    start with it and are long enough to be international. A digit string
+    too long to be national that starts with the calling code of another
+    country is ambiguous and rejected rather than rewritten into a wrong
+    number. Without a default country, such numbers are kept as they are.
+
+    Args:
+        number: Raw phone number
+        default_phone_code: Calling code of the default country, e.g. '237'
+    """
+    raw = (number or '').strip()
+    number = _SEPARATORS_RE.sub('', raw)
+    if number.startswith('+'):
+        digits = number[1:]
+    elif number.startswith('00'):
+        digits = number[2:]
+    elif not default_phone_code:
+        return raw or None
+    elif not number.isdigit():
+        return None
+    elif number.startswith('0'):
+        digits = default_phone_code + number.lstrip('0')
+    elif number.startswith(default_phone_code) and len(number) >= len(default_phone_code) + MIN_DIGITS:
+        digits = number
+    elif len(number) > MAX_NATIONAL_DIGITS and calling_code_of(number):
+        return None
+    else:
+        digits = default_phone_code + number
+    if not digits.isdigit() or digits[0] == '0' or not MIN_DIGITS <= len(digits) <= MAX_DIGITS:
+        return None
+    return '+' + digits
+
+
+def normalize_numbers(numbers, default_phone_code):
+    """Normalise a batch of phone numbers, see :func:`normalize_number`.
+
+    Returns:
+        list: E.164 numbers, None for invalid ones, in the input order
+    """
+    default_phone_code = str(default_phone_code or '')
+    return [normalize_number(number, default_phone_code) for number in numbers]
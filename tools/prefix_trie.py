@@ -0,0 +1,69 @@
+"""Prefix trie used to route phone numbers to SMS providers.
+
+Keys are digit strings (country calling codes or longer number prefixes)
+and a lookup returns the value of the longest key that prefixes the number,
+walking the number once::
+
+    trie = PrefixTrie()
+    trie.insert('237', 'cameroon')
+    trie.insert('2376', 'cameroon mobile')
+    trie.longest_match('237699000000')   # 'cameroon mobile'
+"""
+
+_VALUE = object()
+
+
+def digits_of(number):
+    """Return the digits of a phone number in international form.
+
+    Formatting characters are ignored and a leading ``00`` international
+    access code is dropped, so ``+237 6 99``, ``00237699`` and ``237699``
+    all give ``237699``.
+    """
+    digits = ''.join(c for c in number or '' if c.isdigit())
+    if digits.startswith('00'):
+        digits = digits[2:]
+    return digits
+
+
+class PrefixTrie:
+    """A trie of digit prefixes mapped to values."""
+
+    __slots__ = ('root', 'size')
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, prefix, value):
+        """Map a prefix to a value, replacing the previous value if any."""
+        node = self.root
+        for digit in digits_of(prefix):
+            node = node.setdefault(digit, {})
+        if _VALUE not in node:
+            self.size += 1
+        node[_VALUE] = value
+
+    def get(self, prefix, default=None):
+        """Return the value mapped to exactly this prefix."""
+        node = self.root
+        for digit in digits_of(prefix):
+            node = node.get(digit)
+            if node is None:
+                return default
+        return node.get(_VALUE, default)
+
+    def longest_match(self, number, default=None):
+        """Return the value of the longest prefix of ``number``."""
+        node = self.root
+        result = node.get(_VALUE, default)
+        for digit in digits_of(number):
+            node = node.get(digit)
+            if node is None:
+                break
+            if _VALUE in node:
+                result = node[_VALUE]
+        return result
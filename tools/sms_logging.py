@@ -0,0 +1,117 @@
+"""Logging helpers for the SMS hot paths.
+
+Payloads, headers and responses are passed to the logger wrapped in lazy
+objects: they are only serialised, redacted and truncated when a record is
+actually emitted, so disabled levels cost nothing. Logs about a single
+message go through :func:`log_sampled`, which only emits a fraction of
+them (see :func:`set_sample_rate`)::
+
+    _logger.debug("Request payload: %s", lazy_json(payload))
+    log_sampled(_logger, logging.INFO, "SMS %s delivered", sms_id)
+"""
+import json
+import random
+import re
+
+# Keys whose values are never written to the logs
+SECRET_KEY_RE = re.compile(r'pass|secret|token|key|auth|signature|credential', re.IGNORECASE)
+REDACTED = '***'
+
+# Maximum length of a payload, header set or body in a log record
+MAX_LENGTH = 512
+
+_sample_rate = 1.0
+
+
+def set_sample_rate(rate):
+    """Set the fraction, between 0 and 1, of per-message logs that are emitted."""
+    global _sample_rate
+    _sample_rate = min(max(rate, 0.0), 1.0)
+
+
+def get_sample_rate():
+    return _sample_rate
+
+
+def log_sampled(logger, level, msg, *args):
+    """Log a per-message record, keeping only a sample of them."""
+    if logger.isEnabledFor(level) and (_sample_rate >= 1.0 or random.random() < _sample_rate):
+        logger.log(level, msg, *args)
+
+
+def redact(value):
+    """Return a copy of a decoded JSON value with its secrets masked."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if SECRET_KEY_RE.search(str(key)) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def truncate(text, limit=MAX_LENGTH):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return '%s... (%d more characters)' % (text[:limit], len(text) - limit)
+
+
+class _Lazy:
+    """Defer building a log argument until the record is formatted."""
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return self.func(*self.args)
+
+    __repr__ = __str__
+
+
+def _dump_json(value, limit):
+    try:
+        text = json.dumps(redact(value), default=str)
+    except (TypeError, ValueError):
+        text = repr(value)
+    return truncate(text, limit)
+
+
+def lazy_json(value, limit=MAX_LENGTH):
+    """Log argument rendering ``value`` as redacted, truncated JSON."""
+    return _Lazy(_dump_json, value, limit)
+
+
+def lazy_text(text, limit=MAX_LENGTH):
+    """Log argument rendering ``text`` truncated."""
+    return _Lazy(truncate, text, limit)
+
+
+def _dump_json_body(body, limit):
+    try:
+        value = json.loads(body)
+    except ValueError:
+        return truncate(body.decode(errors='replace'), limit)
+    return _dump_json(value, limit)
+
+
+def lazy_json_body(body, limit=MAX_LENGTH):
+    """Log argument rendering an encoded JSON request body as redacted, truncated JSON."""
+    return _Lazy(_dump_json_body, body, limit)
+
+
+def _dump_response(response, limit):
+    return 'status %s, headers %s, body %s' % (
+        response.status_code, _dump_json(dict(response.headers), limit), truncate(response.text, limit))
+
+
+def lazy_response(response, limit=MAX_LENGTH):
+    """Log argument rendering the status, redacted headers and truncated body of an HTTP response.
+
+    The body is only decoded when the record is emitted.
+    """
+    return _Lazy(_dump_response, response, limit)
@@ -0,0 +1,59 @@
+"""Encoding and segment count of SMS bodies.
+
+A body made only of characters of the GSM 03.38 alphabet is sent in GSM-7:
+160 septets fit in one SMS, and a concatenated message carries 153 per
+segment. Characters of the extension table take two septets. Any other
+character makes the whole body UCS-2: 70 UTF-16 code units in one SMS, 67
+per segment of a concatenated message.
+
+:func:`analyze_bodies` classifies many bodies at once, analysing each
+distinct body a single time, as a mailing usually shares a few bodies
+between all of its recipients::
+
+    analyze_bodies(['Hello', 'Hello', 'Prix: 10€ ✓'])
+    # [('gsm7', 1), ('gsm7', 1), ('ucs2', 1)]
+"""
+import math
+from functools import lru_cache
+
+GSM7_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+GSM7_EXTENSION = frozenset('\f^{}\\[~]|€')
+GSM7 = GSM7_BASIC | GSM7_EXTENSION
+
+# (units in a single SMS, units per segment of a concatenated SMS)
+SEGMENT_SIZES = {
+    'gsm7': (160, 153),
+    'ucs2': (70, 67),
+}
+
+
+def segments_of(encoding, units):
+    """Return the number of segments of a body of ``units`` septets or code units."""
+    single, multi = SEGMENT_SIZES[encoding]
+    if units <= single:
+        return 1
+    return math.ceil(units / multi)
+
+
+@lru_cache(maxsize=4096)
+def analyze_body(body):
+    """Return the (encoding, segment count) of an SMS body.
+
+    Returns:
+        tuple: ('gsm7' or 'ucs2', number of segments, at least 1)
+    """
+    body = body or ''
+    characters = set(body)
+    if characters <= GSM7:
+        septets = len(body) + sum(body.count(char) for char in characters & GSM7_EXTENSION)
+        return 'gsm7', segments_of('gsm7', septets)
+    return 'ucs2', segments_of('ucs2', len(body.encode('utf-16-le')) // 2)
+
+
+def analyze_bodies(bodies):
+    """Return the (encoding, segment count) of every body, in order."""
+    results = {body: analyze_body(body) for body in set(bodies)}
+    return [results[body] for body in bodies]